@@ -1,8 +1,11 @@
 import urllib
 import urllib2
 import json
+import sys
 
 url = 'http://localhost:8000'
+# "async" as first argument submits a job and polls for its progress instead of waiting on a single request
+asyncMode = len(sys.argv) > 1 and sys.argv[1] == 'async'
 
 data = {
     "nameShifts" : ["MOR", "NON", "NOC"],
@@ -36,9 +39,35 @@ data = {
 jsonData = json.dumps(data)
 
 print(jsonData)
-post_req = urllib2.Request(url)
-post_req.add_header('Content-Type', 'application/json')
-response = urllib2.urlopen(post_req, json.dumps(data))
+
+if asyncMode:
+    post_req = urllib2.Request(url + '/jobs')
+    post_req.add_header('Content-Type', 'application/json')
+    try:
+        response = urllib2.urlopen(post_req, jsonData)
+    except urllib2.HTTPError as e:
+        # bad request (4xx), the body is the JSON error
+        print(e.read())
+        sys.exit(1)
+    job = json.loads(response.read())
+    response.close()
+
+    # long-poll the status until the job ends, showing the best cost found so far
+    while job['Status'] not in ('done', 'failed'):
+        print("Job %s %s, best cost %i" % (job['JobId'], job['Status'], job['Cost']))
+        response = urllib2.urlopen(url + '/jobs/%s?wait=30&version=%i' % (job['JobId'], job['Version']))
+        job = json.loads(response.read())
+        response.close()
+
+    response = urllib2.urlopen(url + '/jobs/%s/result' % job['JobId'])
+else:
+    post_req = urllib2.Request(url)
+    post_req.add_header('Content-Type', 'application/json')
+    try:
+        response = urllib2.urlopen(post_req, json.dumps(data))
+    except urllib2.HTTPError as e:
+        # bad request (4xx), the body is the JSON error
+        response = e
 
 
 print(response.read())
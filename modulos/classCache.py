@@ -0,0 +1,123 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ResultCache(object):
+    """Content-addressed cache for the results of the scheduling requests.
+
+    The results are kept on an in-memory LRU with a time to live, and optionally
+    on a directory (one JSON file per key) that survives the server restarts, bounded
+    the same way (the modification time of a file is its last use).
+
+    Attributes:
+        maxsize -- max number of results kept in memory, and on the directory
+        ttl -- seconds a result is valid, 0 never expires
+        directory -- directory for the on-disk results, None to keep them only in memory
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, directory=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(*parts):
+        """Canonical hash of JSON-serializable parts, the order of the dict keys doesn't matter."""
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached result for key, None if it isn't cached or it has expired."""
+        now = time.time()
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None and not self._expired(item[0], now):
+                self._items[key] = item  # most recently used
+                self.hits += 1
+                return item[1]
+
+        item = self._load(key, now)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+                return None
+            self._insert(key, item)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, result):
+        """Cache the result for key."""
+        item = (time.time(), result)
+        with self._lock:
+            self._items.pop(key, None)
+            self._insert(key, item)
+        self._save(key, item)
+
+    def _insert(self, key, item):
+        self._items[key] = item
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, key, now):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if self._expired(stored['Time'], now):
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(self._path(key), None)  # most recently used
+        except OSError:
+            pass
+        return stored['Time'], stored['Result']
+
+    def _save(self, key, item):
+        if self.directory is None:
+            return
+        # write to a temporary file first so a reader never sees a half-written result
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'Time': item[0], 'Result': item[1]}, f, separators=(',', ':'))
+        os.rename(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used results of the directory over maxsize."""
+        used = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    used.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass  # removed by another thread
+        used.sort()
+        for mtime, path in used[:max(len(used) - self.maxsize, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
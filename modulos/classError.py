@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 class Error(Exception):
     """Clase base para excepciones en el módulo."""
     pass
@@ -8,10 +9,79 @@ class GenericError(Error):
     Atributos:
         expresion -- expresión de entrada en la que ocurre el error
         mensaje -- explicación del error
+        number -- código del error en la respuesta JSON
+        status -- código HTTP de la respuesta
     """
 
+    status = 400
+
     def __init__(self, expresion, mensaje):
         self.number = 109
         self.expresion = expresion
         self.mensaje = mensaje
         super(GenericError, self).__init__(self.mensaje)
+
+    def __reduce__(self):
+        # para pasar la excepción entre procesos (multiprocessing.Pool)
+        return (self.__class__, (self.expresion, self.mensaje))
+
+    def toJSON(self):
+        """Respuesta JSON del error."""
+        return {"Error": self.number, "Message": self.mensaje, "Expression": self.expresion}
+
+class RequestError(GenericError):
+    """Excepción lanzada por una petición de planificación mal formada (HTTP 400).
+
+    Atributos:
+        expresion -- campo de la petición en el que ocurre el error
+        mensaje -- explicación del error
+        detalles -- lista de dicts con los problemas encontrados
+        number -- código del error en la respuesta JSON
+        status -- código HTTP de la respuesta
+    """
+
+    def __init__(self, expresion, mensaje, detalles=None):
+        super(RequestError, self).__init__(expresion, mensaje)
+        self.number = 110
+        self.detalles = detalles or []
+
+    def __reduce__(self):
+        return (self.__class__, (self.expresion, self.mensaje, self.detalles))
+
+    def toJSON(self):
+        data = super(RequestError, self).toJSON()
+        data["Details"] = self.detalles
+        return data
+
+class InfeasibleError(RequestError):
+    """Excepción lanzada por una petición de planificación sin solución (HTTP 422).
+
+    Atributos:
+        expresion -- campo de la petición en el que ocurre el error
+        mensaje -- explicación del error
+        detalles -- lista de dicts con los problemas encontrados
+        number -- código del error en la respuesta JSON
+        status -- código HTTP de la respuesta
+    """
+
+    status = 422
+
+    def __init__(self, expresion, mensaje, detalles=None):
+        super(InfeasibleError, self).__init__(expresion, mensaje, detalles)
+        self.number = 111
+
+class SolverError(GenericError):
+    """Excepción lanzada cuando el solver no responde, p.ej. un proceso del pool muerto (HTTP 500).
+
+    Atributos:
+        expresion -- parte del servidor en la que ocurre el error
+        mensaje -- explicación del error
+        number -- código del error en la respuesta JSON
+        status -- código HTTP de la respuesta
+    """
+
+    status = 500
+
+    def __init__(self, expresion, mensaje):
+        super(SolverError, self).__init__(expresion, mensaje)
+        self.number = 112
@@ -0,0 +1,157 @@
+import itertools
+
+import numpy as np
+
+
+class FeasibilityChecker(object):
+    """Pre-solve check of a scheduling request, it finds in milliseconds the requests that the
+    hard constraints of the solver can't satisfy, without building the model.
+
+    Every check is a necessary condition of the model, so a request with problems has no
+    solution, but a request without problems can still be infeasible.
+
+    Attributes:
+        demand -- numpy array [day, task, shift] with the required workers
+        allowed -- numpy bool array [worker, task], True if the task is on the ATasks of the worker
+                   (worker 0, the non assigned worker, is excluded)
+        avoidOvertime -- a worker does at most one task and shift a day, else one task a shift
+        maxConsecutiveWorkingDays -- max consecutive working days of a worker
+        problems -- list of dicts explaining why the request is infeasible, filled by check()
+    """
+
+    C_MAXHALLTASKS = 12  # max number of tasks to check every subset of tasks, else only the single tasks and all
+    C_MAXWORKERSTASKDAY = 99  # same bound as SchedulingSolver.C_MAXWORKERSTASKDAY
+    C_REQUESTCHECKS = ('requirementsShape', 'workerTasks')  # checks of a malformed request, not an infeasible one
+
+    def __init__(self, data):
+        self.data = data
+        self.demand = None
+        self.allowed = None
+        self.avoidOvertime = data.get('avoidOvertime', True)
+        self.maxConsecutiveWorkingDays = data.get('maxConsecutiveWorkingDays')
+        self.problems = []
+
+    def check(self):
+        """Run all the checks and return the list of problems, empty if none is found."""
+        self.problems = []
+        if self._checkShape():
+            self._checkTasksWithoutWorkers()
+            self._checkWorkersPerDay()
+            self._checkMatching()
+            self._checkConsecutiveDays()
+        return self.problems
+
+    def _problem(self, check, message, **fields):
+        fields.update({"Check": check, "Message": message})
+        self.problems.append(fields)
+
+    def _checkShape(self):
+        """allRequirements must be [day][task][shift] of non negative ints and ATasks valid task indexes."""
+        data = self.data
+        ntasks, nshifts = len(data['nameTasks']), len(data['nameShifts'])
+        try:
+            self.demand = np.array(data['allRequirements'], dtype=np.int64)
+        except (TypeError, ValueError):
+            self.demand = None
+        if self.demand is None or self.demand.ndim != 3 or self.demand.shape[1:] != (ntasks, nshifts):
+            self._problem("requirementsShape",
+                          "allRequirements must be a list of days of %i tasks x %i shifts" % (ntasks, nshifts))
+            return False
+        if (self.demand < 0).any():
+            day, task, shift = [int(i) for i in np.argwhere(self.demand < 0)[0]]
+            self._problem("requirementsShape", "Negative requirement on day %i" % day,
+                          Day=day, Task=data['nameTasks'][task], Shift=data['nameShifts'][shift])
+            return False
+
+        self.allowed = np.zeros((max(len(data['allWorkers']) - 1, 0), ntasks), dtype=bool)
+        for w, worker in enumerate(data['allWorkers'][1:]):
+            tasks = worker['ATasks']
+            if any(t not in range(ntasks) for t in tasks):
+                self._problem("workerTasks", "Worker %s has a task out of range on ATasks %s" % (worker['Name'], tasks),
+                              Worker=worker['Name'])
+                return False
+            self.allowed[w, tasks] = True
+        return True
+
+    def _checkTasksWithoutWorkers(self):
+        """A task required on some day that no worker is allowed to do."""
+        required = self.demand.sum(axis=(0, 2))
+        for t in np.flatnonzero((required > 0) & ~self.allowed.any(axis=0)):
+            self._problem("taskWithoutWorkers", "Nobody is allowed to do the task %s" % self.data['nameTasks'][t],
+                          Task=self.data['nameTasks'][t], Required=int(required[t]))
+
+    def _checkWorkersPerDay(self):
+        """
+        A day needing more workers than available (addHardTotalWorkers_OnDay), or a day or a cell over the solver
+        bound (tot_workers_day and num_workers_task_day go up to C_MAXWORKERSTASKDAY).
+        """
+        nworkers = self.allowed.shape[0]
+        required = self.demand.sum(axis=(1, 2))
+        for d in np.flatnonzero(required > nworkers):
+            self._problem("workersPerDay", "More workers are required on day %i than available" % d,
+                          Day=int(d), Required=int(required[d]), Available=nworkers)
+
+        for d in np.flatnonzero(required > self.C_MAXWORKERSTASKDAY):
+            self._problem("workersPerDayBound", "More than %i workers required on day %i" %
+                          (self.C_MAXWORKERSTASKDAY, d), Day=int(d), Required=int(required[d]))
+
+        for d, t, s in np.argwhere(self.demand > self.C_MAXWORKERSTASKDAY):
+            self._problem("workersPerTask", "More than %i workers required for a task on day %i" %
+                          (self.C_MAXWORKERSTASKDAY, d), Day=int(d), Task=self.data['nameTasks'][t],
+                          Shift=self.data['nameShifts'][s], Required=int(self.demand[d, t, s]))
+
+    def _taskSubsets(self, ntasks):
+        """Bool matrix [subset, task] with the subsets of tasks to check on the matching bound."""
+        if ntasks <= self.C_MAXHALLTASKS:
+            subsets = np.array(list(itertools.product([False, True], repeat=ntasks)), dtype=bool)[1:]
+        else:
+            subsets = np.vstack([np.eye(ntasks, dtype=bool), np.ones((1, ntasks), dtype=bool)])
+        return subsets
+
+    def _checkMatching(self):
+        """
+        Matching bound (Hall's condition) between the workers and the required tasks: for every subset of tasks
+        the required workers can't be more than the workers allowed to do any task of the subset. It is checked
+        for every day when a worker does one task a day (avoidOvertime), else for every day and shift.
+        """
+        ntasks = self.demand.shape[1]
+        if ntasks == 0:
+            return
+        subsets = self._taskSubsets(ntasks)
+        # workers allowed to do some task of every subset
+        available = (self.allowed.astype(np.int64).dot(subsets.T) > 0).sum(axis=0)
+
+        if self.avoidOvertime:
+            required = self.demand.sum(axis=2).dot(subsets.T)                  # [day, subset]
+        else:
+            required = np.einsum('dts,kt->dsk', self.demand, subsets)           # [day, shift, subset]
+
+        for cell in np.argwhere(required > available):
+            subset = cell[-1]
+            tasks = [self.data['nameTasks'][t] for t in np.flatnonzero(subsets[subset])]
+            fields = {"Day": int(cell[0]), "Tasks": tasks, "Required": int(required[tuple(cell)]),
+                      "Available": int(available[subset])}
+            if not self.avoidOvertime:
+                fields["Shift"] = self.data['nameShifts'][cell[1]]
+            self._problem("matching", "Not enough workers allowed to do %s on day %i" % (", ".join(tasks), cell[0]),
+                          **fields)
+
+    def _checkConsecutiveDays(self):
+        """
+        Every window of maxConsecutiveWorkingDays + 1 days has a non working day for every worker, so the
+        required working days of the window can't be more than workers x maxConsecutiveWorkingDays
+        """
+        maxwdays = self.maxConsecutiveWorkingDays
+        ndays = self.demand.shape[0]
+        if not maxwdays or maxwdays + 1 > ndays:
+            return
+        if self.avoidOvertime:
+            perday = self.demand.sum(axis=(1, 2))
+        else:
+            perday = self.demand.sum(axis=1).max(axis=1)
+        window = np.convolve(perday, np.ones(maxwdays + 1, dtype=np.int64), mode='valid')
+        capacity = self.allowed.shape[0] * maxwdays
+        for d in np.flatnonzero(window > capacity):
+            self._problem("consecutiveDays", "Days %i to %i need more working days than allowed by the max of %i "
+                          "consecutive working days" % (d, d + maxwdays, maxwdays),
+                          Day=int(d), Required=int(window[d]), Available=capacity)
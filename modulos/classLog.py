@@ -0,0 +1,37 @@
+import json
+import logging
+
+C_FORMAT = "%(asctime)s %(levelname)s [%(requestid)s] %(name)s: %(message)s"
+
+
+class RequestIdFilter(logging.Filter):
+    """Set the request id of the records logged outside of a request ("-"), so every record
+    can be formatted with C_FORMAT."""
+
+    def filter(self, record):
+        if not hasattr(record, 'requestid'):
+            record.requestid = '-'
+        return True
+
+
+def setupLogging(level=logging.INFO, stream=None):
+    """Log to stream (stderr by default) the records of level or higher, with their request id."""
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter(C_FORMAT))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def requestLogger(name, requestid):
+    """Logger adding the request id (correlation id) to every record."""
+    return logging.LoggerAdapter(logging.getLogger(name), {'requestid': requestid})
+
+
+def logEvent(logger, event, **fields):
+    """Log a structured event at INFO level, a JSON with the event name and its fields
+    (e.g. the duration of a build phase or the size of the model)."""
+    if logger.isEnabledFor(logging.INFO):
+        fields["Event"] = event
+        logger.info("event %s", json.dumps(fields, sort_keys=True))
@@ -0,0 +1,78 @@
+import collections
+
+import numpy as np
+from ortools.linear_solver import pywraplp
+
+
+class ShiftsLowerBound(object):
+    """Lower bound of the cost of the broken AShifts soft constraints (addSoft_AllowedShiftsToWorker).
+
+    Relaxation of the model that only keeps the requirements, the ATasks of the workers and
+    the one task and shift a day (avoidOvertime) or one task a shift rule. For every day the
+    requirements that can be covered without breaking any AShifts are a max flow between the
+    (task, shift) cells and the workers, solved as a transportation LP (its optimum is integral),
+    and every cell that can't be covered needs a worker out of its AShifts.
+
+    The workers with the same ATasks and AShifts are merged in a single node, and the days with
+    the same requirements are solved once.
+
+    Attributes:
+        penalty -- cost of a worker working a day out of its AShifts
+        demand -- numpy array [day, task, shift] with the required workers
+        avoidOvertime -- a worker does at most one task and shift a day, else one task a shift
+        groups -- dict (tasks mask, shifts mask) -> number of workers (worker 0 excluded)
+        violations -- list with the min number of workers out of their AShifts for every day, filled by compute()
+    """
+
+    def __init__(self, workers, requirements, avoidOvertime, penalty):
+        self.penalty = penalty
+        self.demand = np.array(requirements, dtype=np.int64)
+        self.avoidOvertime = avoidOvertime
+        ntasks, nshifts = self.demand.shape[1:]
+        self.groups = collections.Counter()
+        for worker in workers[1:]:
+            tasks = tuple(t in worker['ATasks'] for t in range(ntasks))
+            shifts = tuple(s in worker['AShifts'] for s in range(nshifts))
+            self.groups[tasks, shifts] += 1
+        self.violations = []
+
+    def compute(self):
+        """Return the lower bound of the cost."""
+        solved = {}
+        self.violations = []
+        for day in self.demand:
+            key = day.tobytes()
+            if key not in solved:
+                solved[key] = self._dayViolations(day)
+            self.violations.append(solved[key])
+        return self.penalty * sum(self.violations)
+
+    def _dayViolations(self, day):
+        """Min number of workers out of their AShifts to cover the requirements [task, shift] of a day."""
+        if self.avoidOvertime:
+            return int(day.sum()) - self._maxCovered(day, range(day.shape[1]))
+        # a worker can do a task on every shift, it breaks its AShifts once a day for any number of shifts
+        return max([int(day[:, s].sum()) - self._maxCovered(day, [s]) for s in range(day.shape[1])] or [0])
+
+    def _maxCovered(self, day, shifts):
+        """Max number of the required workers of the shifts of a day covered by workers on their AShifts."""
+        cells = [(t, s) for t in range(day.shape[0]) for s in shifts if day[t, s] > 0]
+        if not cells:
+            return 0
+        solver = pywraplp.Solver('ShiftsLowerBound', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+        x = {}
+        for (tasks, ashifts), count in self.groups.items():
+            free = [(t, s) for t, s in cells if tasks[t] and ashifts[s]]
+            pairs = [solver.NumVar(0, solver.infinity(), '') for cell in free]
+            for cell, var in zip(free, pairs):
+                x.setdefault(cell, []).append(var)
+            # every worker covers one cell of the day (one of the shift without avoidOvertime)
+            if pairs:
+                solver.Add(solver.Sum(pairs) <= count)
+        if not x:
+            return 0
+        for cell, variables in x.items():
+            solver.Add(solver.Sum(variables) <= int(day[cell]))
+        solver.Maximize(solver.Sum([v for variables in x.values() for v in variables]))
+        solver.Solve()
+        return int(round(solver.Objective().Value()))
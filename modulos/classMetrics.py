@@ -0,0 +1,74 @@
+import collections
+import threading
+
+import numpy as np
+
+
+class MetricsRegistry(object):
+    """Aggregated metrics of the requests solved by the server, served on GET /metrics.
+
+    Every JSON result with "Metrics" (see SearchMetrics on solver_v3) is added to the
+    totals and to a window of the last searches, so the time limit and the search
+    strategy can be tuned from the production data: a time to best far below the
+    time limit means the limit can be lowered.
+
+    Attributes:
+        window -- number of recent searches kept for the percentiles
+        counters -- dict with the number of requests by outcome (Solved, NoSolution, RequestError, ...)
+        totals -- dict with the sum of Branches, Failures, Solutions and WallTime of all the searches
+        recent -- deque with the metrics of the last searches
+    """
+
+    C_PERCENTILES = (50, 90, 99)
+    C_FIELDS = ('TimeToFirst', 'TimeToBest', 'WallTime', 'Branches', 'Failures', 'Solutions', 'Cost')
+    C_TOTALS = ('Branches', 'Failures', 'Solutions', 'WallTime')
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.counters = collections.defaultdict(int)
+        self.totals = dict((k, 0) for k in self.C_TOTALS)
+        self.recent = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def count(self, outcome):
+        """Count a request by its outcome."""
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def record(self, result):
+        """Add the JSON result of a solved request, counted as Solved or NoSolution."""
+        if not isinstance(result, dict):
+            return
+        metrics = result.get("Metrics")
+        with self._lock:
+            self.counters["Solved" if result.get("Error") == 0 else "NoSolution"] += 1
+            if metrics is None:
+                return
+            for k in self.C_TOTALS:
+                self.totals[k] += metrics.get(k) or 0
+            self.recent.append(dict(metrics, Cost=result.get("Cost")))
+
+    def toJSON(self):
+        """Return the counters, the totals and the percentiles of the recent searches."""
+        with self._lock:
+            counters = dict(self.counters)
+            totals = dict(self.totals)
+            recent = list(self.recent)
+
+        stats = {}
+        for field in self.C_FIELDS:
+            values = np.array([m[field] for m in recent if m.get(field) is not None], dtype=np.float64)
+            if values.size == 0:
+                continue
+            stats[field] = dict(("P%i" % p, float(v)) for p, v in zip(self.C_PERCENTILES,
+                                                                     np.percentile(values, self.C_PERCENTILES)))
+            stats[field].update({"Mean": float(values.mean()), "Max": float(values.max())})
+
+        # share of the time limit used to find the best solution
+        ratios = np.array([float(m["TimeToBest"]) / m["TimeLimit"] for m in recent
+                           if m.get("TimeToBest") is not None and m.get("TimeLimit")])
+        if ratios.size:
+            stats["TimeToBestRatio"] = dict(("P%i" % p, float(v)) for p, v in zip(self.C_PERCENTILES,
+                                                                                 np.percentile(ratios, self.C_PERCENTILES)))
+
+        return {"Requests": counters, "Totals": totals, "Searches": len(recent), "Recent": stats}
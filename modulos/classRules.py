@@ -0,0 +1,142 @@
+import collections
+
+
+class ShiftRules(object):
+    """Rules on the sequence of days of a worker, compiled to a single automaton (a DFA) for a
+    TransitionConstraint per worker instead of a constraint per rule, worker and window of days.
+
+    Every day of a worker is a symbol: 0 not working, s + 1 working the shift s (with avoidOvertime a
+    worker works a single shift a day), or without avoidOvertime 1 working. The rules are strings:
+
+        "maxConsecutive <n>"       at most n consecutive working days
+        "minRest <m> in <l>"       at least m non working days on every l consecutive days
+        "forbid <day> <day> ..."   forbidden sequence of consecutive days, every day is the name of a
+                                   shift, "work" (any shift), "rest" or "any", e.g. "forbid NOC MAN"
+
+    The state of the automaton is the state of every rule, only the reachable states are built. The days
+    before the first day of the roster are the days known of the worker (initialDays), before them its
+    consecutive working days (initialWorkingDays) worked on an unknown shift, and before them non
+    working days.
+
+    Attributes:
+        nameShifts -- names of the shifts
+        avoidOvertime -- a worker works at most one shift a day, else the shifts of the rules can't be told apart
+        rules -- list of the parsed rules, (kind, args)
+        symbols -- number of symbols of a day
+        unknown -- symbol of a working day on an unknown shift, only before the first day
+        states -- dict state of the rules -> index of the state of the automaton, filled by compile()
+        transitions -- list of (state, symbol, next state), filled by compile()
+    """
+
+    C_MAXSTATES = 10000  # max states of an automaton
+    C_MAXLAPSE = 14  # max days of the window of a minRest rule, its state keeps the last days
+
+    def __init__(self, nameShifts, rules, avoidOvertime):
+        self.nameShifts = list(nameShifts)
+        self.avoidOvertime = avoidOvertime
+        self.symbols = len(self.nameShifts) + 1 if avoidOvertime else 2
+        self.unknown = self.symbols
+        self.rules = [self._parse(rule) for rule in rules]
+        self.states = {}
+        self.transitions = []
+
+    def _parse(self, rule):
+        """Parse a rule string, raise ValueError if it is not valid."""
+        try:
+            words = rule.split()
+            if words[0] == 'maxConsecutive' and len(words) == 2 and int(words[1]) >= 0:
+                return ('maxConsecutive', (int(words[1]),))
+            if words[0] == 'minRest' and len(words) == 4 and words[2] == 'in' and \
+                    0 <= int(words[1]) <= int(words[3]) <= self.C_MAXLAPSE:
+                return ('minRest', (int(words[1]), int(words[3])))
+            if words[0] == 'forbid' and len(words) > 1:
+                return ('forbid', (tuple(self._daySymbols(day) for day in words[1:]),))
+        except (AttributeError, IndexError, ValueError, KeyError):
+            pass
+        raise ValueError("Not valid rule %r, expected \"maxConsecutive <n>\", \"minRest <m> in <l>\" (l up to %i) "
+                         "or \"forbid <day> ...\" with shift names, work, rest or any" % (rule, self.C_MAXLAPSE))
+
+    def _daySymbols(self, day):
+        """Set of the symbols of a day of a forbid rule."""
+        work = set(range(1, self.symbols + 1))  # the unknown shift is a working day
+        if day == 'rest':
+            return frozenset([0])
+        if day == 'work':
+            return frozenset(work)
+        if day == 'any':
+            return frozenset(work | set([0]))
+        if not self.avoidOvertime:
+            raise KeyError(day)  # a day may have several shifts, a rule can't name one
+        return frozenset([self.nameShifts.index(day) + 1])
+
+    def _start(self):
+        """State of every rule before the first day."""
+        return tuple(0 if kind in ('maxConsecutive', 'minRest') else frozenset() for kind, args in self.rules)
+
+    def _step(self, state, symbol):
+        """State of every rule after a day, None if a rule is broken."""
+        works = 1 if symbol != 0 else 0
+        following = []
+        for (kind, args), current in zip(self.rules, state):
+            if kind == 'maxConsecutive':
+                current = current + 1 if works else 0
+                if current > args[0]:
+                    return None
+            elif kind == 'minRest':
+                # the working days of the last lapse days as a bitmask
+                rest, lapse = args
+                window = ((current << 1) | works) & ((1 << lapse) - 1)
+                if lapse - bin(window).count('1') < rest:
+                    return None
+                current = window & ((1 << (lapse - 1)) - 1)
+            else:
+                # the prefixes of the forbidden sequence matched up to this day
+                days = args[0]
+                current = frozenset(n + 1 for n in set(current) | set([0]) if symbol in days[n])
+                if len(days) in current:
+                    return None
+            following.append(current)
+        return tuple(following)
+
+    def initialState(self, workingdays=0, days=()):
+        """State of the rules after the days before the first day (symbols, oldest first) and the consecutive
+        working days not on them, the days that break a rule are not counted (as the bound of
+        addHard_MaxConsecutiveWorkingDays, the worker rests first)."""
+        days = list(days)
+        streak = len(days) - next((n for n in range(len(days) - 1, -1, -1) if days[n] == 0), -1) - 1
+        if streak == len(days):
+            days = [self.unknown] * max(workingdays - streak, 0) + days
+        state = self._start()
+        for symbol in days:
+            following = self._step(state, symbol)
+            if following is not None:
+                state = following
+        return state
+
+    def compile(self, initial=()):
+        """
+        Build the automaton reachable from the states of initial, raise ValueError if it has too many states.
+
+        :param initial: list of states of the rules (see initialState)
+        :return: list of the indexes of the states of initial
+        """
+        self.states = {}
+        self.transitions = []
+        pending = collections.deque()
+        for state in initial:
+            if state not in self.states:
+                self.states[state] = len(self.states)
+                pending.append(state)
+        while pending:
+            state = pending.popleft()
+            for symbol in range(self.symbols):
+                following = self._step(state, symbol)
+                if following is None:
+                    continue
+                if following not in self.states:
+                    if len(self.states) >= self.C_MAXSTATES:
+                        raise ValueError("The shift rules need more than %i states" % self.C_MAXSTATES)
+                    self.states[following] = len(self.states)
+                    pending.append(following)
+                self.transitions.append((self.states[state], symbol, self.states[following]))
+        return [self.states[state] for state in initial]
@@ -0,0 +1,37 @@
+import array
+
+
+class SoftConstraintTable(object):
+    """Metadata of the soft constraints added to a model, one row per soft constraint.
+
+    The rows are kept on typed arrays (a C int per field) instead of solver vars or
+    dicts, so the table only grows with the soft constraints actually added and a
+    row is decoded in O(1) from its index.
+
+    Attributes:
+        type -- code of the soft constraint (thisSoftConstraint of the addSoft_ methods)
+        worker -- index of the worker of the soft constraint
+        day -- index of the (first) day of the soft constraint
+        penalty -- cost of breaking the soft constraint
+    """
+
+    def __init__(self):
+        self.type = array.array('i')
+        self.worker = array.array('i')
+        self.day = array.array('i')
+        self.penalty = array.array('i')
+
+    def __len__(self):
+        return len(self.type)
+
+    def append(self, ctype, worker, day, penalty):
+        """Add a row and return its index."""
+        self.type.append(ctype)
+        self.worker.append(worker)
+        self.day.append(day)
+        self.penalty.append(penalty)
+        return len(self.type) - 1
+
+    def row(self, n):
+        """Return the row n as a dict."""
+        return {"Type": self.type[n], "Worker": self.worker[n], "Day": self.day[n], "Penalty": self.penalty[n]}
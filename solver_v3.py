@@ -1,13 +1,63 @@
 from __future__ import print_function
 from ortools.constraint_solver import pywrapcp
+from ortools.linear_solver import pywraplp
 from enum import Enum
+from modulos.classCache import ResultCache
+from modulos.classError import GenericError, InfeasibleError, RequestError, SolverError
+from modulos.classFeasibility import FeasibilityChecker
+from modulos.classLog import logEvent, requestLogger, setupLogging
+from modulos.classLowerBound import ShiftsLowerBound
+from modulos.classMetrics import MetricsRegistry
+from modulos.classRules import ShiftRules
+from modulos.classSoftConstraints import SoftConstraintTable
 import BaseHTTPServer
+import Queue
+import SocketServer
+import argparse
+import collections
 import json
+import logging
+import multiprocessing
+import numpy as np
+import os
+import random
+import select
+import signal
+import socket
+import threading
+import time
 import urlparse
+import uuid
+
+
+log = logging.getLogger('solver_v3')
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('--host', default = 'localhost',
+                    help = 'address to listen on')
+parser.add_argument('--port', default = 8000, type = int,
+                    help = 'port to listen on')
+parser.add_argument('--workers', default = 0, type = int,
+                    help = 'size of the solver process pool, 0 solves the requests one by one on the server process')
+parser.add_argument('--queue', default = 8, type = int,
+                    help = 'max number of requests waiting for a free solver process')
+parser.add_argument('--cache-size', default = 256, type = int,
+                    help = 'max number of results kept on the result cache, 0 disables the cache')
+parser.add_argument('--cache-ttl', default = 3600, type = int,
+                    help = 'seconds a cached result is valid, 0 never expires')
+parser.add_argument('--cache-dir', default = None,
+                    help = 'directory to keep the cached results on disk')
+parser.add_argument('--jobs', default = multiprocessing.cpu_count(), type = int,
+                    help = 'max number of async jobs solved at the same time')
+parser.add_argument('--log-level', default = 'INFO', choices = ['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                    help = 'min level of the logged records, DEBUG logs every constraint added to the model')
+parser.add_argument('--quiet', action = 'store_true',
+                    help = 'production mode, only log warnings and errors')
 
 
 class ChooseTypeDb(Enum):
-    CHOOSE_RANDOM = 2
+    CHOOSE_RANDOM = 3
     CHOOSE_FIRST_UNBOUND = 2
     CHOOSE_MIN_SIZE_HIGHEST_MAX = 7
     CHOOSE_MIN_SIZE_HIGHEST_MIN = 5
@@ -15,6 +65,213 @@ class ChooseTypeDb(Enum):
     CHOOSE_MIN_SIZE_LOWEST_MIN = 4
 
 
+class SolutionCallback(pywrapcp.SearchMonitor):
+    """
+    Search monitor that calls a function for every improving solution accepted by the search,
+    it can be shared by several searches on the same solver (e.g. the LNS restarts)
+    """
+
+    def __init__(self, solver, cost, callback):
+        pywrapcp.SearchMonitor.__init__(self, solver)
+        self._cost = cost
+        self._callback = callback
+        self._nsolutions = 0
+        self._best = None
+
+    def AtSolution(self):
+        cost = self._cost.Value()
+        if self._best is None or cost < self._best:
+            self._best = cost
+            self._nsolutions += 1
+            self._callback(cost, self._nsolutions)
+        return False
+
+
+class SearchMetrics(pywrapcp.SearchMonitor):
+    """
+    Search monitor that records the progress of the search: branches, failures, solutions, the time to
+    the first and to the best solution and the cost of every improving solution (trajectory). It can be
+    shared by several searches on the same solver (e.g. the LNS restarts), the times and counters start
+    when it is created
+    """
+
+    def __init__(self, solver, cost):
+        pywrapcp.SearchMonitor.__init__(self, solver)
+        self._solver = solver
+        self._cost = cost
+        self._start = solver.WallTime()
+        self._branches = solver.Branches()
+        self._failures = solver.Failures()
+        self.nsolutions = 0
+        self.best = None
+        self.timeToFirst = None
+        self.timeToBest = None
+        self.trajectory = []  # [ms, cost] of every improving solution
+
+    def AtSolution(self):
+        cost = self._cost.Value()
+        ms = self._solver.WallTime() - self._start
+        self.nsolutions += 1
+        if self.timeToFirst is None:
+            self.timeToFirst = ms
+        if self.best is None or cost < self.best:
+            self.best = cost
+            self.timeToBest = ms
+            self.trajectory.append([ms, cost])
+        return False
+
+    def toJSON(self):
+        """
+        :return: dict with the metrics of the search until now
+        """
+        return {
+            "Branches": self._solver.Branches() - self._branches,
+            "Failures": self._solver.Failures() - self._failures,
+            "Solutions": self.nsolutions,
+            "WallTime": self._solver.WallTime() - self._start,
+            "TimeToFirst": self.timeToFirst,
+            "TimeToBest": self.timeToBest,
+            "Trajectory": self.trajectory
+        }
+
+
+class StagnationLimit(pywrapcp.SearchMonitor):
+    """
+    Search monitor that finishes the search when the cost reaches its lower bound or when the search
+    stagnates, stall_time ms or stall_branches branches without an improving solution (0 disables them).
+    The stagnation is counted from the first solution, before it only the time limit stops the search.
+    It can be shared by several searches on the same solver (e.g. the LNS restarts)
+    """
+
+    def __init__(self, solver, cost, stall_time, stall_branches, bound=0):
+        pywrapcp.SearchMonitor.__init__(self, solver)
+        self._solver = solver
+        self._cost = cost
+        self._stall_time = stall_time
+        self._stall_branches = stall_branches
+        self._bound = bound
+        self._best = None
+        self._time = None
+        self._branches = None
+        self.reason = None  # 'bound' or 'stagnation' when it has finished the search
+
+    def AtSolution(self):
+        cost = self._cost.Value()
+        if self._best is None or cost < self._best:
+            self._best = cost
+            self._time = self._solver.WallTime()
+            self._branches = self._solver.Branches()
+            if cost <= self._bound:
+                self.reason = 'bound'
+                self._solver.FinishCurrentSearch()
+        return False
+
+    def BeginNextDecision(self, db):
+        if self._best is not None and self.stalled():
+            self._solver.FinishCurrentSearch()
+
+    def stalled(self):
+        """
+        :return: True if the search has reached the bound or it has stagnated
+        """
+        if self.reason is None and self._best is not None and (
+                (self._stall_time and self._solver.WallTime() - self._time >= self._stall_time) or
+                (self._stall_branches and self._solver.Branches() - self._branches >= self._stall_branches)):
+            self.reason = 'stagnation'
+        return self.reason is not None
+
+
+class ScheduleLns(pywrapcp.BaseLns):
+    """
+    LNS operator for the assigned(w,t,s,d) vars, every fragment relaxes in turn one day, two
+    workers (one alone can't change anything while the others are fixed), one task/shift column
+    or a random block of cells
+    """
+
+    NEIGHBOURHOODS = ('day', 'workers', 'column', 'block')
+
+    def __init__(self, variables, num_workers, num_tasks, num_shifts, num_days, rand, block_size):
+        pywrapcp.BaseLns.__init__(self, variables)
+        self.__num_workers = num_workers
+        self.__num_tasks = num_tasks
+        self.__num_shifts = num_shifts
+        self.__num_days = num_days
+        self.__random = rand
+        self.__block_size = block_size
+        self.__next = 0
+
+    def InitFragments(self):
+        pass
+
+    def NextFragment(self):
+        kind = self.NEIGHBOURHOODS[self.__next % len(self.NEIGHBOURHOODS)]
+        self.__next += 1
+        workers = range(1, self.__num_workers)
+        tasks = range(self.__num_tasks)
+        shifts = range(self.__num_shifts)
+        days = range(self.__num_days)
+
+        if kind == 'day':
+            days = [self.__random.choice(days)]
+        elif kind == 'workers':
+            workers = self.__random.sample(workers, min(2, len(workers)))
+        elif kind == 'column':
+            tasks = [self.__random.choice(tasks)]
+            shifts = [self.__random.choice(shifts)]
+        else:
+            while self.FragmentSize() < self.__block_size:
+                self.AppendToFragment(self.__random.randint(0, self.Size() - 1))
+            return True
+
+        for w in workers:
+            for t in tasks:
+                for s in shifts:
+                    for d in days:
+                        # same order as SchedulingSolver.assignations
+                        self.AppendToFragment(((w * self.__num_tasks + t) * self.__num_shifts + s) * self.__num_days + d)
+        return True
+
+
+class SharedBoundDb(pywrapcp.PyDecisionBuilder):
+    """
+    Decision builder that wraps another one and, before every decision, bounds the cost below the
+    best cost found by any of the processes of a portfolio (shared multiprocessing.Value)
+    """
+
+    def __init__(self, db, cost, bound):
+        pywrapcp.PyDecisionBuilder.__init__(self)
+        self.__db = db
+        self.__cost = cost
+        self.__bound = bound
+
+    def Next(self, solver):
+        bound = self.__bound.value
+        if bound <= self.__cost.Max():
+            self.__cost.SetMax(bound - 1)  # fails the branch if it can't improve the shared bound
+        return self.__db.NextWrapper(solver)
+
+    def DebugString(self):
+        return 'SharedBoundDb(' + self.__db.DebugString() + ')'
+
+
+class CurrentSolution:
+    """
+    Collector-like access to the values of the solution being accepted by the search
+    """
+
+    def Value(self, n, var):
+        return var.Value()
+
+
+class MipSolution:
+    """
+    Collector-like access to the values of the solution of the MIP solver (see MipSchedulingSolver)
+    """
+
+    def Value(self, n, var):
+        return int(round(var.solution_value()))
+
+
 class SchedulingSolver:
     """
     Class for Scheduling problems
@@ -23,9 +280,6 @@ class SchedulingSolver:
 
     #TODO:  Cost to assign a task for a worker (soft)
 
-    # Creates the solver.
-    solver = pywrapcp.Solver("schedule_shifts_tasks")
-
     # Global Variables
     num_workers = 0
     num_days = 0
@@ -44,12 +298,37 @@ class SchedulingSolver:
     nconstraints = 0  #used to count the number of Soft constraints add to the system
 
     C_MAXWORKERSTASKDAY = 99    # max number of scheduled workers for a single task in a day
-    C_MAXSOFTCONSTRAINTS = 200  # max number of soft constraints reserved space (can be updated)
     C_IMPLEMENTEDSOFTCONSTRAINTS = 10 # number of implemented SOFT constraints on this solver version class
-    C_TIMELIMIT = 10000 # time limit for the solver in ms
-
-
-    def __init__(self):
+    C_TIMELIMIT = 10000 # time limit for the solver in ms, the max of the timeLimit of a request
+    C_STALLTIME = 5000 # ms without an improving solution to stop the search, 0 never stops
+    C_STALLBRANCHES = 0 # branches without an improving solution to stop the search, 0 never stops
+    C_LNSFRAGMENT = 30 # number of cells relaxed by the random block LNS fragments
+    C_LNSFAILLIMIT = 30 # fail limit when exploring a LNS fragment
+    C_LNSRESTART = 2000 # time in ms before the LNS restarts from the best solution with a new seed
+    C_LNSSEED = 0 # seed for the LNS random generator
+    C_PORTFOLIOGRACE = 5 # seconds to build the models of a portfolio before its time limit counts
+    C_MAXCOST = 2**31 - 2 # max value for the cost (an int32 with a sentinel, see solvePortfolio), see calculateCost
+    C_ASHIFTSPENALTY = 40 # cost of a worker working a day out of its AShifts
+    C_SHIFTHOURS = 8 # hours of a shift when the request has no shiftHours
+    C_WORKLOADPENALTY = 1 # cost of an hour over or under the TargetHours of a worker
+    C_SHIFTSLIMITPENALTY = 20 # cost of a shift out of the MinShifts..MaxShifts of a worker on a period
+    C_WORKLOADFIELDS = ('TargetHours', 'MinShifts', 'MaxShifts', 'PeriodShifts')  # optional workload fields of a worker
+    C_REQUESTFIELDS = ('nameShifts', 'nameTasks', 'allWorkers', 'allRequirements', 'avoidOvertime',
+                       'maxConsecutiveWorkingDays', 'leaveRequests')  # required fields of a JSON request
+    C_WORKERFIELDS = ('Name', 'ATasks', 'AShifts')  # required fields of a worker of a JSON request
+    C_ENGINES = ('cp', 'mip')  # search engines of a request, see newSchedulingSolver
+    C_RANDOMMODES = ('portfolio', 'lns')  # search modes that may find a different roster every time, see cacheKey
+    C_VERSION = "3.1.4" # version of the model, change it when the results of the solver change (see requestKey)
+
+
+    def __init__(self, requestid=None):
+
+        # Creates the solver, every instance owns its own solver (see freeSolver)
+        self.solver = pywrapcp.Solver("schedule_shifts_tasks")
+
+        # Logger with the correlation id of the request
+        self.requestid = requestid or uuid.uuid4().hex[:8]
+        self.log = requestLogger('solver_v3', self.requestid)
 
         # Ortools solver Vars
 
@@ -61,45 +340,80 @@ class SchedulingSolver:
         self.assigned_worker = {}
         self.tot_workers_day = {}
         self.assigned ={}
+        self.isworkingday = {}
         self.task = {}
         self.shifts_flat = []
         self.tasks_flat = []
         self.works_shift = []
         self.workers_flat = []
+        self.workers_task_day_flat = []
         self.assignations = []
-        self.cost = self.solver.IntVar(0, 5000, "cost")
-
-        self.brkconstraints = {}
-        self.brkconstraints_cost = []
-        self.brkconstraints_where = {}
+        self.cost = None  # created by calculateCost, with the max cost of the soft constraints
+        self.maxcost = 0  # max value of the cost, the penalty times the max violation of every soft constraint
+
+        self.brkconstraints = []  # violation var of every soft constraint, created by _addSoftConstraint
+        self.softconstraints = SoftConstraintTable()  # metadata of every soft constraint
+
+        self.hint = None  # set of the (w,t,s,d) assigned on a previous roster
+        self.initialWorkingDays = None  # consecutive working days of every worker before the first day
+        self.initialDays = None  # symbols of the days of every worker before the first day, see ShiftRules
+        self.symmetryBreaking = True  # order the rows of the interchangeable workers, see addHardSymmetryBreaking
+        self.shiftHours = []  # hours of every shift, for the TargetHours of the workers
+        self.periodDays = 0  # days of the periods of the MinShifts and MaxShifts of the workers
+        self.periodStart = 0  # days of the first period before the first day of the roster
+        self.workloadPenalty = self.C_WORKLOADPENALTY
+        self.shiftsPenalty = self.C_SHIFTSLIMITPENALTY
+        self.fairnessPenalty = 0  # cost of a shift away from the mean shifts of the workers, 0 is off
+        self.fairnessMean = None  # mean shifts of every worker on the whole roster, see fairnessMean
+        self.shiftRules = []  # rules on the sequence of days of every worker, see ShiftRules
+        self.solution = None  # numpy array [worker, task, shift, day] of the best solution, see _assignedArray
+        self.searchMode = 'tree'
+        self.timeLimit = self.C_TIMELIMIT
+        self.stallTime = self.C_STALLTIME
+        self.stallBranches = self.C_STALLBRANCHES
+        self.lowerBound = 0  # min cost of any solution, the search stops when it is reached
+        self.stagnation = None  # StagnationLimit of the last search
+        self.monitors = []  # extra search monitors for searchSolutionsCollector
+        self.metrics = None  # SearchMetrics of the last search
 
         self.p = None
         self.n = None
 
-    def _brkWhereSet(self, worker, day, constraint):
+    def _brkWhereGet(self, n):
         """
-        Returns the code for a given broken constraint
-        :param worker:
-        :param day:
-        :param constraint:
-        :return: integer with the code of the worker x day broken
+        Describe where the soft constraint n is, decoded from the softconstraints table
+
+        :param n: index of the soft constraint
+        :return: String format like "SoftConstraint c with worker w (name) in day d,"
         """
-        #code = xxx00000 + worker*days + day  / xxx the soft constraint index broken
-        return int(pow(10,5)) * constraint + (worker * self.num_days) + day
+        worker = self.softconstraints.worker[n]
+        return "SoftConstraint %i with worker %i (%s) in day %i," % (self.softconstraints.type[n], worker,
+                                                                   self.nameWorkers[worker]['Name'],
+                                                                   self.softconstraints.day[n])
 
 
-    def _brkWhereGet(self, code):
+    def _addSoftConstraint(self, broken, constraint, worker, day, penalty, upper=1):
         """
+        Add a soft constraint to the model, its violation var is created here and its metadata (where it is)
+        is kept on the softconstraints table, outside the model
 
-        :param code: integer with the code to get worker and day broken
-        :return: String format like "(worker,day)"
+        :param broken: expression equal to 1 when the soft constraint is broken
+        :param constraint: internal index code of the soft constraint, must be > 0
+        :param worker: index of the worker
+        :param day: index of the day
+        :param penalty: the cost for to broke this constraint
+        :param upper: max value of the violation, the penalty is paid once per unit (e.g. hours of a workload)
+        :return: index of the soft constraint
         """
-        _con = code / int(pow(10,5))
-        code = int(str(code)[-5:])
-        _fil = code/self.num_days
-        _col = (code % self.num_days)
-        _str = "SoftConstraint %i with worker %i (%s) in day %i," % (_con, _fil,self.nameWorkers[int(_fil)]['Name'], _col)
-        return str(_str)
+        n = self.nconstraints
+        brk = self.solver.IntVar(0, upper, "brk %i" % n)
+        self.solver.Add(brk == broken)
+
+        self.brkconstraints.append(brk)
+        self.softconstraints.append(constraint, worker, day, penalty)
+        self.maxcost += penalty * upper
+        self.nconstraints += 1
+        return n
 
 
     def space(self, n):
@@ -245,6 +559,106 @@ class SchedulingSolver:
         self.dayRequirements = self.allRequirements
         self.num_days = len(self.dayRequirements)
 
+        # Search mode: "tree" (searchSolutionsCollector), "lns" (searchSolutionsLns) or
+        # "portfolio" (solvePortfolio, "portfolioResult": "best" or "first")
+        self.searchMode = data.get('searchMode', 'tree')
+
+        # Stop of the search: "timeLimit" (ms, the deadline of the request, up to C_TIMELIMIT),
+        # "stallTime" (ms) and "stallBranches" without improving the best solution (see StagnationLimit)
+        self.timeLimit, self.stallTime, self.stallBranches = self.searchLimits(data)
+
+        # Optional consecutive working days of every worker before the first day (see solveRolling)
+        self.initialWorkingDays = data.get('initialWorkingDays')
+        # and the days before the first day (oldest first, 0 not working, else the shift + 1 or 1 without
+        # avoidOvertime), for the shiftRules across the first day
+        self.initialDays = data.get('initialDays')
+
+        # Symmetry breaking of the interchangeable workers, on by default (see addHardSymmetryBreaking)
+        self.symmetryBreaking = data.get('symmetryBreaking', True)
+
+        # Workload of the workers: "TargetHours" of the roster, "MinShifts" and "MaxShifts" of every period of
+        # "periodDays" days (all the roster by default) and the shifts away from the mean ("fairnessPenalty")
+        self.shiftHours = data.get('shiftHours') or [self.C_SHIFTHOURS] * self.num_shifts
+        self.periodDays = data.get('periodDays') or self.num_days
+        self.periodStart = data.get('periodStart', 0)
+        self.workloadPenalty = data.get('workloadPenalty', self.C_WORKLOADPENALTY)
+        self.shiftsPenalty = data.get('shiftsPenalty', self.C_SHIFTSLIMITPENALTY)
+        self.fairnessPenalty = data.get('fairnessPenalty', 0)
+        # the mean of a component or window of a roster is the one of the whole roster (see fairnessMean)
+        self.fairnessMean = data.get('fairnessMean')
+
+        # Rules on the sequence of days of every worker, more than maxConsecutiveWorkingDays (see ShiftRules),
+        # e.g. ["forbid NOC MAN", "minRest 2 in 7"], a worker can add its own on "ShiftRules"
+        self.shiftRules = data.get('shiftRules') or []
+
+        # Optional previous roster to warm-start the search (see createDecisionBuilderPhase)
+        if data.get('previousSolution'):
+            self.loadPreviousSolution(data['previousSolution'])
+        if data.get('previousAssigned'):
+            self.loadPreviousAssigned(data['previousAssigned'])
+
+
+    @classmethod
+    def searchLimits(cls, data):
+        """
+        Limits of the search of a request, "timeLimit" (ms) is the deadline of the request, it can only
+        shorten C_TIMELIMIT, "stallTime" (ms) and "stallBranches" stop the search when the best solution
+        doesn't improve. A rolling request (see solveRolling) has C_TIMELIMIT, or "windowTimeLimit" (ms),
+        for every window, its "timeLimit" is the deadline of all the windows
+
+        :param data: dict with the JSON request
+        :return: (timeLimit, stallTime, stallBranches)
+        """
+        windows, window = 1, cls.C_TIMELIMIT
+        if data.get('windowDays'):
+            ndays = len(data['allRequirements'])
+            windows = max(-(-(ndays - min(data.get('frozenDays') or 0, ndays)) // data['windowDays']), 1)
+            window = min(data.get('windowTimeLimit') or cls.C_TIMELIMIT, cls.C_TIMELIMIT)
+        return (min(data.get('timeLimit') or windows * window, windows * cls.C_TIMELIMIT),
+                data.get('stallTime', cls.C_STALLTIME),
+                data.get('stallBranches', cls.C_STALLBRANCHES))
+
+
+    def loadPreviousSolution(self, solution):
+        """
+        Load a previous roster, as returned on the JSON result of showSolutionWorkersToScreen, to be
+        used as the first solution tried by the search
+
+        :param solution: dict with the "Tasks" and "Workers" of the JSON result
+        :return: void
+        """
+        names = {}
+        for w in range(self.num_workers - 1, 0, -1):  # the first worker with a name wins
+            names[self.nameWorkers[w]['Name']] = w
+
+        cells = []
+        t = 0
+        for row, days in zip(solution.get('Tasks', []), solution.get('Workers', [])):
+            # rows are "<task name[:7]>[<n>] " grouped by task in the order of nameTasks
+            prefix = row.strip().rsplit('[', 1)[0]
+            while t < self.num_tasks and self.nameTasks[t][:7] != prefix:
+                t += 1
+            if t == self.num_tasks:
+                break
+            for d, shifts in enumerate(days[:self.num_days]):
+                for s, name in enumerate(shifts[:self.num_shifts]):
+                    if name in names:
+                        cells.append((names[name], t, s, d))
+        self.loadPreviousAssigned(cells)
+
+
+    def loadPreviousAssigned(self, cells):
+        """
+        Load a previous roster as the assigned[(w,t,s,d)] cells set to 1, every other cell is 0
+
+        :param cells: list of [worker, task, shift, day]
+        :return: void
+        """
+        self.hint = set(tuple(c[:4]) for c in cells
+                        if 0 < c[0] < self.num_workers and 0 <= c[1] < self.num_tasks and
+                        0 <= c[2] < self.num_shifts and 0 <= c[3] < self.num_days)
+
+
     def definedModel(self):
         """
         Define de model, initialice Ortools vars
@@ -328,16 +742,27 @@ class SchedulingSolver:
                 a = self.isworkingday[(w, d)]
                 self.solver.Add(a == self.solver.Max([self.assigned[(w,t,s,d)] for t in range(self.num_tasks) for s in range(self.num_shifts)]))
 
-        # -----------------------------------------------------------------------------------------------------------
-        # Set vars for soft solving
-        for i in range(self.C_MAXSOFTCONSTRAINTS):
-            self.brkconstraints[i] = self.solver.IntVar(0,1,"brk %i" % i)
-            self.brkconstraints_where[i] = self.solver.IntVar(0, 10000000, "brkw %i" %i)
-            self.brkconstraints_cost.append(0)
-
         self.mShowWorkers = []
 
 
+    def buildModel(self, data):
+        """
+        Load the request and build its model, logging the duration of every phase and the size of the model
+        as structured events
+
+        :param data: dict with the JSON request
+        :return: void
+        """
+        for phase, method, args in (('loadJSONData', self.loadJSONData, (data,)),
+                                     ('definedModel', self.definedModel, ()),
+                                     ('hardConstraints', self.hardConstraints, ()),
+                                     ('softConstraints', self.softConstraints, ())):
+            start = time.time()
+            method(*args)
+            logEvent(self.log, 'phase', Phase=phase, Ms=int((time.time() - start) * 1000))
+        logEvent(self.log, 'model', SoftConstraints=self.nconstraints, **self.modelStats())
+
+
     def hardConstraints(self):
         """
         Define de Hard constraints for the problem, solver will search the feasible solutions
@@ -345,7 +770,7 @@ class SchedulingSolver:
         :return: void
         """
         # HARD CONSTRAINTS
-        print ("Implementing hard constraints...")
+        self.log.debug("Implementing hard constraints...")
         # All workers for a day must be different for to do the task+shift, to avoid paying overtime, 
         #else a worker should be able to work in multiple shifts, but not at the same time
         if self.avoidOvertime == True:
@@ -371,10 +796,11 @@ class SchedulingSolver:
 
         # Set the scheduling number of working days from the requirement
         # Each worker works 5 or 6 days in a week.
+        # The max consecutive working days and the shiftRules (e.g. "minRest 2 in 7") are a single automaton
 
-        self.addHard_MaxConsecutiveWorkingDays(self.maxConsecutiveWorkingDays)
+        self.addHardShiftRules()
 
-        #self.addHard_MinNonWorkingDays(2, 7)
+        self.addHardSymmetryBreaking()
 
     def addHardAllDifferentWorkers_OnDay(self):
         """
@@ -383,7 +809,7 @@ class SchedulingSolver:
         :return: void
         """
         # All workers for a day must be different except the scape value (0) *None* to do the task on shift
-        print ("Setup HARD: All workers for a day must be different.")
+        self.log.debug("Setup HARD: All workers for a day must be different.")
         for d in range(self.num_days):
             temp = [self.workers_task_day[(w, t, s, d)] for w in range(1,self.num_workers) for t in range(self.num_tasks) for s in range(self.num_shifts)]
             self.solver.Add(self.solver.AllDifferentExcept(temp,0))
@@ -395,7 +821,7 @@ class SchedulingSolver:
         :return: void
         """
         # All workers for a day must be different except the scape value (0) *None* to do the task on shift
-        print ("Setup HARD: All workers for a day must be different.")
+        self.log.debug("Setup HARD: All workers for a day must be different.")
         for d in range(self.num_days):
             for s in range(self.num_shifts):
                 temp = [self.workers_task_day[(w, t, s, d)] for w in range(1,self.num_workers) for t in range(self.num_tasks)]
@@ -408,14 +834,10 @@ class SchedulingSolver:
         :return: void
         """
         # All workers for a day must be different except the scape value (0) *None* to do the task on shift
-        print ("Setup HARD: All leave requests should be accomodated.")
-
-        print (self.leaveRequests)
-        print ("loop")
+        self.log.debug("Setup HARD: All leave requests should be accomodated: %s", self.leaveRequests)
 
         for r in (self.leaveRequests):
             temp = [self.workers_task_day[(r[0], t, r[2], r[1])] for t in range(self.num_tasks)]
-            print (temp)
             self.solver.Add(self.solver.AllDifferentExcept(temp,0))
               
         # for d in range(self.num_days):
@@ -449,11 +871,13 @@ class SchedulingSolver:
         :param nworkers: Total number of workers to set
         :param iday: Index of the day to set
         :return: void
+        :raise InfeasibleError: if there are not enough workers for the day
         """
 
         if nworkers > (self.num_workers-1):
-            print ("More workers are required to assign on day %i,required at least %i." %(iday, nworkers))
-            exit(0)
+            raise InfeasibleError("allRequirements[%i]" % iday,
+                                  "More workers are required to assign on day %i, required at least %i." %
+                                  (iday, nworkers))
 
         if nworkers > 0:
             #print("debug.Assigning %i total workers to day %i." % (nworkers, iday ))
@@ -473,7 +897,8 @@ class SchedulingSolver:
         :return: void
         """
 
-        print ("debug.Assigning %i workers to day %i at task %s and shift %s" %(nworkers, iday, self.nameTasks[rtask], self.nameShifts[rshift]))
+        self.log.debug("Assigning %i workers to day %i at task %s and shift %s", nworkers, iday, self.nameTasks[rtask],
+                       self.nameShifts[rshift])
 
         # set the number os tasks to do on this day
         self.solver.Add(self.num_workers_task_day[(rtask, rshift, iday)] == nworkers)
@@ -496,7 +921,7 @@ class SchedulingSolver:
             r=[2,3]
             for s in r:
                 exp = self.assigned[4,1,s,0] == 0
-                print (exp)
+                self.log.debug("%s", exp)
                 self.solver.Add(exp)
         """
         # create a list with not allowed tasks
@@ -504,10 +929,7 @@ class SchedulingSolver:
         for n in atasks:
             _notallowed.remove(n)
 
-        strNotAllowedNames = []
-        for i in _notallowed:
-            strNotAllowedNames.append(str(self.nameTasks[i]))
-        print ("Setup HARD: Worker %i, not allowed to tasks=%s" %(iworker,strNotAllowedNames))
+        self.log.debug("Setup HARD: Worker %i, not allowed to tasks=%s", iworker, _notallowed)
 
         if len(_notallowed) == 0:
             return 0
@@ -518,55 +940,184 @@ class SchedulingSolver:
                     self.solver.Add(self.assigned[iworker,t,s,d] == 0)
 
 
-    def addHard_MaxConsecutiveWorkingDays(self, maxwdays):
+    def addHard_MaxConsecutiveWorkingDays(self, maxwdays, workers=None):
         """
-        Set the max working days for the problem on a hard constraint (only search for feasible solutions)
+        Set the max working days for the problem on a hard constraint (only search for feasible solutions),
+        a sliding window per worker and day, the CP models use the automaton of addHardShiftRules instead
 
         :param maxwdays:
+        :param workers: list of the indexes of the workers, all by default
         :return:
         """
         # Each worker works max consecutive days
         #for w in range(1, self.num_workers):
         #print (" days=" + str(self.num_days))
-        for w in range(1, self.num_workers):
+        for w in range(1, self.num_workers) if workers is None else workers:
             #print ("debug.Hard: Assigning %i max consecutive working days for worker %i" %(maxwdays,w))
             for dini in range(self.num_days - maxwdays +1):
                 if (dini+maxwdays) < self.num_days:
                     r = [self.isworkingday[(w, dini + d)] for d in range(maxwdays+1)]
                     self.solver.Add(self.solver.Sum(r) <= maxwdays)
 
+            # the working days before the first day, only the last consecutive ones bound the first days
+            if self.initialWorkingDays and self.initialWorkingDays[w] > 0:
+                left = max(maxwdays - self.initialWorkingDays[w], 0)
+                r = [self.isworkingday[(w, d)] for d in range(min(left + 1, self.num_days))]
+                self.solver.Add(self.solver.Sum(r) <= left)
+
 
-    def addHard_MinNonWorkingDays(self, minnwdays, lapse_days):
+    def addHard_MinNonWorkingDays(self, minnwdays, lapse_days, workers=None):
         """
         Set the min non-working days for the scheduler on a Hard constraint (only search for feasible solutions)
 
-        :param minnwdays: min non-working days that have to be assigned consecutively
+        :param minnwdays: min non-working days on every time lapse
         :param lapse_days: number of days for the time lapse to compute
+        :param workers: list of the indexes of the workers, all by default
         :return:
         """
 
 
         if lapse_days < 2:
-            print ("Day time lapse too short!, can't add Hard constraint")
-
-        lapse_days= lapse_days -1
+            self.log.warning("Day time lapse too short!, can't add Hard constraint")
 
         if lapse_days > self.num_days:
             lapse_days = self.num_days
 
-        for w in range(1, 1):
-            print("debug.Hard: Assigning %i min non working days for worker %i for every %i days scheduled" %(minnwdays, w, lapse_days+1))
-            dini=0
-            regla = [self.isworkingday[(w, dini + d)] == 0 for d in range(lapse_days + 1)]
-            self.solver.Add(self.solver.Sum(regla) < minnwdays)
+        for w in range(1, self.num_workers) if workers is None else workers:
+            self.log.debug("Hard: Assigning %i min non working days for worker %i for every %i days scheduled",
+                           minnwdays, w, lapse_days)
+            # every window of lapse_days days has at least minnwdays non working days, the windows
+            # across the first day count the working days before it (initialDays)
+            before = [1 if day else 0 for day in self.initialDays[w]] if self.initialDays else []
+            for dini in range(-min(len(before), lapse_days - 1), self.num_days - lapse_days + 1):
+                temp = [self.isworkingday[(w, dini + d)] for d in range(max(-dini, 0), lapse_days)]
+                worked = sum(before[len(before) + dini:]) if dini < 0 else 0
+                self.solver.Add(self.solver.Sum(temp) <= max(lapse_days - minnwdays - worked, 0))
 
-            """
-            for dini in range(self.num_days - lapse_days + 1):
-                if (dini + lapse_days) < self.num_days:
-                    print("debug.Hard-> From day %i, to day %i" %(dini, (dini + lapse_days)))
-                    temp = [self.isworkingday[(w, dini + d)] == 0 for d in range(lapse_days + 1)]
-                    self.solver.Add(self.solver.Sum(temp) < minnwdays)
-            """
+
+    def workerRules(self, iworker):
+        """
+        :return: list with the rules on the days of a worker (see ShiftRules), the maxConsecutiveWorkingDays,
+                 the shiftRules of the request and the ShiftRules of the worker
+        """
+        rules = [] if self.maxConsecutiveWorkingDays is None else ["maxConsecutive %i" % self.maxConsecutiveWorkingDays]
+        return rules + list(self.shiftRules) + list(self.nameWorkers[iworker].get('ShiftRules') or [])
+
+
+    def _ruleWorkers(self):
+        """
+        :return: list of (rules, workers) with the workers of every different list of rules
+        """
+        workers = collections.OrderedDict()
+        for w in range(1, self.num_workers):
+            workers.setdefault(tuple(self.workerRules(w)), []).append(w)
+        return list(workers.items())
+
+
+    def addHardShiftRules(self):
+        """
+        Constraint the sequence of days of every worker with its rules (see workerRules), compiled to a single
+        automaton for every list of rules and posted as a TransitionConstraint per worker, starting from the
+        days before the first day (initialDays and initialWorkingDays). It replaces a constraint per rule, worker and window of days
+
+        :return: void
+        :raise RequestError: a rule is not valid or the automaton is too big
+        """
+        initial = self.initialWorkingDays or [0] * self.num_workers
+        days = self.initialDays or [[]] * self.num_workers
+        for rules, workers in self._ruleWorkers():
+            if not rules:
+                continue
+            try:
+                automaton = ShiftRules(self.nameShifts, rules, self.avoidOvertime)
+                states = automaton.compile([automaton.initialState(initial[w], days[w]) for w in workers])
+            except ValueError as e:
+                raise RequestError("shiftRules", str(e))
+            finals = list(range(len(automaton.states)))
+            for w, state in zip(workers, states):
+                self.solver.Add(self.solver.TransitionConstraint(self._daySymbols(w), automaton.transitions,
+                                                                 state, finals))
+            logEvent(self.log, 'rules', Rules=list(rules), Workers=len(workers), States=len(automaton.states),
+                     Transitions=len(automaton.transitions))
+
+
+    def _daySymbols(self, iworker):
+        """
+        :return: list with the symbol of every day of a worker (see ShiftRules), 0 not working, else the shift + 1
+                 (with avoidOvertime, a single shift a day) or 1
+        """
+        if not self.avoidOvertime:
+            return [self.isworkingday[(iworker, d)] for d in range(self.num_days)]
+        return [self._workerLoad(iworker, [d], list(range(1, self.num_shifts + 1))).Var() for d in range(self.num_days)]
+
+
+    def equivalentWorkers(self):
+        """
+        Classes of interchangeable workers, the workers with the same ATasks, AShifts, initial working days,
+        workload (C_WORKLOADFIELDS) and ShiftRules and without leave requests, every constraint of the model
+        is the same for all of them so any roster with their rows permuted is also a solution with the same cost
+
+        :return: list of the classes with more than one worker, lists of worker indexes (worker 0 is excluded)
+        """
+        leave = set(r[0] for r in self.leaveRequests)
+        initial = self.initialWorkingDays or [0] * self.num_workers
+        classes = {}
+        for w in range(1, self.num_workers):
+            if w not in leave:
+                key = (tuple(sorted(set(self.nameWorkers[w]['ATasks']))),
+                       tuple(sorted(set(self.nameWorkers[w]['AShifts']))), initial[w],
+                       tuple(self.initialDays[w]) if self.initialDays else (),
+                       tuple(self.nameWorkers[w].get(k) for k in self.C_WORKLOADFIELDS),
+                       tuple(self.nameWorkers[w].get('ShiftRules') or ()))
+                classes.setdefault(key, []).append(w)
+        return sorted(c for c in classes.values() if len(c) > 1)
+
+
+    def addHardSymmetryBreaking(self):
+        """
+        Break the symmetry of the interchangeable workers (see equivalentWorkers), the row of a worker must be
+        lexicographically greater or equal than the row of the next worker of its class, so the search
+        doesn't explore every permutation of the same roster. With a previous roster the workers of a class
+        are ordered by their previous rows, the previous roster is still a solution
+
+        :return: void
+        """
+        if not self.symmetryBreaking:
+            return
+        classes = self.equivalentWorkers()
+        for workers in classes:
+            if self.hint is not None:
+                workers.sort(key=self._workerHintRow, reverse=True)
+            for w1, w2 in zip(workers, workers[1:]):
+                self._addRowOrder(w1, w2)
+        logEvent(self.log, 'symmetry', Classes=len(classes), Workers=sum([len(c) for c in classes]))
+
+
+    def _workerRow(self, iworker):
+        """
+        :return: list with the decision vars of a worker, on the order of the decision builder (see assignations)
+        """
+        return [self.assigned[(iworker, t, s, d)] for t in range(self.num_tasks)
+                                                  for s in range(self.num_shifts)
+                                                  for d in range(self.num_days)]
+
+
+    def _workerHintRow(self, iworker):
+        """
+        :return: list with the values of the row of a worker (see _workerRow) on the previous roster
+        """
+        return [1 if (iworker, t, s, d) in self.hint else 0 for t in range(self.num_tasks)
+                                                            for s in range(self.num_shifts)
+                                                            for d in range(self.num_days)]
+
+
+    def _addRowOrder(self, iworker1, iworker2):
+        """
+        Constraint to order the rows of two interchangeable workers, row(iworker1) >= row(iworker2)
+
+        :return: void
+        """
+        self.solver.Add(self.solver.LexicalLessOrEqual(self._workerRow(iworker2), self._workerRow(iworker1)))
 
 
     def softConstraints(self):
@@ -577,7 +1128,7 @@ class SchedulingSolver:
         :return: void
         """
 
-        print ("Implementing soft constraints...")
+        self.log.debug("Implementing soft constraints...")
         #SOFT CONSTRAINTS EXAMPLE
         # worker = 1 penalize 30 cost if work on day = 0
         #   shifts[(1, 0)] != 0  (worker 1 on day 0) !=0 (working, 0 mean working)
@@ -596,7 +1147,18 @@ class SchedulingSolver:
         #Load soft constraints for the allowed Shifts of the workers
         for w in range(1, self.num_workers):
             #print ("debug.Soft: Setting the shift for %s to %s" %(self.nameWorkers[w]['Name'],self.nameWorkers[w]['AShifts']))
-            self.addSoft_AllowedShiftsToWorker(w, self.nameWorkers[w]['AShifts'], 40 )
+            self.addSoft_AllowedShiftsToWorker(w, self.nameWorkers[w]['AShifts'], self.C_ASHIFTSPENALTY)
+
+        #Load the workload of the workers, one soft constraint per worker and period, not per day
+        for w in range(1, self.num_workers):
+            worker = self.nameWorkers[w]
+            if worker.get('TargetHours') is not None:
+                self.addSoft_TargetHoursToWorker(w, worker['TargetHours'], self.workloadPenalty)
+            if worker.get('MinShifts') is not None or worker.get('MaxShifts') is not None:
+                self.addSoft_ShiftsPerPeriodToWorker(w, worker.get('MinShifts'), worker.get('MaxShifts'),
+                                                     worker.get('PeriodShifts', 0), self.shiftsPenalty)
+        if self.fairnessPenalty:
+            self.addSoft_FairShifts(self.fairnessPenalty)
 
         #------
         # Add max consecutive working days constraint
@@ -607,16 +1169,85 @@ class SchedulingSolver:
 
         #the last constraint is to calculate the final cost  //extern now
         self.calculateCost()
+        self.addCostLowerBound()
 
 
     def calculateCost(self):
         """
-        Calculate the total cost of the broken constraints
+        Calculate the total cost of the broken constraints, the domain of the cost goes up to the
+        max cost of the soft constraints added (maxcost), not a fixed cap
+
+        :return: void
+        """
+        self.cost = self.solver.IntVar(0, min(self.maxcost, self.C_MAXCOST), "cost")
+        self.solver.Add(self.solver.ScalProd(self.brkconstraints, list(self.softconstraints.penalty)) == self.cost)
+
+
+    def addCostLowerBound(self):
+        """
+        Post the lower bound of the cost of the broken AShifts (see ShiftsLowerBound) as a cut on the cost,
+        the search stops as soon as a solution reaches it (see StagnationLimit)
 
         :return: void
+        :raise InfeasibleError: the lower bound is over the max cost, there is no solution to search
         """
-        self.solver.Add(self.solver.Sum((self.brkconstraints[i] * self.brkconstraints_cost[i])
-                                            for i in range(self.nconstraints)) == self.cost)
+        start = time.time()
+        bound = ShiftsLowerBound(self.allWorkers, self.dayRequirements, self.avoidOvertime, self.C_ASHIFTSPENALTY)
+        self.lowerBound = bound.compute()
+        logEvent(self.log, 'bound', LowerBound=self.lowerBound, Ms=int((time.time() - start) * 1000))
+        maxcost = min(self.maxcost, self.C_MAXCOST)
+        if self.lowerBound > maxcost:
+            raise InfeasibleError("allRequirements", "The lower bound of the cost %i is over the max cost %i" %
+                                  (self.lowerBound, maxcost))
+        self.solver.Add(self.cost >= self.lowerBound)
+
+
+    def shiftsCost(self, assigned):
+        """
+        Cost of the broken AShifts (see addSoft_AllowedShiftsToWorker) of a roster, outside of the model
+
+        :param assigned: numpy array [worker, task, shift, day] of the roster
+        :return: the cost
+        """
+        allowed = np.ones((self.num_workers, self.num_shifts), dtype=bool)
+        for w in range(1, self.num_workers):
+            allowed[w] = False
+            allowed[w, self.nameWorkers[w]['AShifts']] = True
+        broken = (assigned.any(axis=1) & ~allowed[:, :, None]).any(axis=1)  # [worker, day]
+        return int(broken.sum()) * self.C_ASHIFTSPENALTY
+
+
+    def rosterCost(self, assigned):
+        """
+        Cost of all the soft constraints (see softConstraints) of a roster, outside of the model, e.g. of a
+        roster merged from the rosters of several models (see solveRolling)
+
+        :param assigned: numpy array [worker, task, shift, day] of the roster
+        :return: the cost
+        """
+        def deviation(value, low, high):
+            return max(value - high if high is not None else 0, low - value if low is not None else 0, 0)
+
+        cost = self.shiftsCost(assigned)
+        shifts = assigned.sum(axis=1)  # [worker, shift, day]
+        perday = shifts.sum(axis=1)  # [worker, day]
+        for w in range(1, self.num_workers):
+            worker = self.nameWorkers[w]
+            if worker.get('TargetHours') is not None:
+                hours = int(np.dot(shifts[w].sum(axis=1), self.shiftHours))
+                cost += deviation(hours, worker['TargetHours'], worker['TargetHours']) * self.workloadPenalty
+            if worker.get('MinShifts') is not None or worker.get('MaxShifts') is not None:
+                first = 0
+                while first < self.num_days:
+                    last = first + self.periodDays - (self.periodStart if first == 0 else 0)
+                    value = int(perday[w, first:last].sum()) + (worker.get('PeriodShifts', 0) if first == 0 else 0)
+                    cost += deviation(value, worker.get('MinShifts') if last <= self.num_days else None,
+                                      worker.get('MaxShifts')) * self.shiftsPenalty
+                    first = last
+        if self.fairnessPenalty:
+            cost += sum([deviation(int(perday[w].sum()), *self._fairShifts(w))
+                         for w in range(1, self.num_workers)]) * self.fairnessPenalty
+        return cost
 
 
     def addSoft_ShiftForworkerOnDay_NotEqualTo(self, iworker, iday, ine_shift, penalty):
@@ -633,14 +1264,8 @@ class SchedulingSolver:
 
         thisSoftConstraint = 1  # internal index code constraint on the solver, must be > 0
 
-        self.solver.Add(self.brkconstraints[self.nconstraints] == 1 *
-                        self.solver.IsEqualCstVar(self.shift[(iworker, iday)], ine_shift))
-
-        self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                        self._brkWhereSet(iworker, iday, thisSoftConstraint))
-
-        self.brkconstraints_cost[self.nconstraints] = penalty
-        self.nconstraints += 1
+        self._addSoftConstraint(self.solver.IsEqualCstVar(self.shift[(iworker, iday)], ine_shift),
+                                thisSoftConstraint, iworker, iday, penalty)
 
 
     def addSoft_AllowedShiftsToWorker(self, iworker, ashift, penalty):
@@ -668,11 +1293,7 @@ class SchedulingSolver:
                                                                       for t in range(self.num_tasks)]
             #temp = [self.shift[iworker, i] == ashift[s] for s in range(num_ashifts)]
             #print ("Debug.Day %i Debug.temp=%s " % (i,temp))
-            self.solver.Add(self.brkconstraints[self.nconstraints] == 1 * (self.solver.Max(temp) == 1))
-            self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                        self._brkWhereSet(iworker, i, thisSoftConstraint))
-            self.brkconstraints_cost[self.nconstraints] = penalty
-            self.nconstraints += 1
+            self._addSoftConstraint(1 * (self.solver.Max(temp) == 1), thisSoftConstraint, iworker, i, penalty)
 
 
     def addSoft_ShiftForworkerOnADay_EqualTo(self, iworker, iday, ie_shift, penalty):
@@ -689,14 +1310,8 @@ class SchedulingSolver:
 
         thisSoftConstraint = 3  # internal index code constraint on the solver, must be > 0
 
-        self.solver.Add(self.brkconstraints[self.nconstraints] == 1 *
-                        self.solver.IsDifferentCstVar(self.shift[iworker, iday], ie_shift))
-
-        self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                        self._brkWhereSet(iworker, iday, thisSoftConstraint))
-
-        self.brkconstraints_cost[self.nconstraints] = penalty
-        self.nconstraints += 1
+        self._addSoftConstraint(self.solver.IsDifferentCstVar(self.shift[iworker, iday], ie_shift),
+                                thisSoftConstraint, iworker, iday, penalty)
 
 
     def addSoft_AfterAShiftForworkerNextShift_NotEqualTo(self, ishift, iworker, ine_shift, penalty):
@@ -718,13 +1333,134 @@ class SchedulingSolver:
         thisSoftConstraint = 4  # internal index code constraint on the solver, must be > 0
 
         for iday in range(self.num_days - 1):
-            self.solver.Add(self.brkconstraints[self.nconstraints] == 1 *
-                            self.solver.IsEqualCstVar(self.solver.IsEqualCstVar(self.shift[(iworker, iday)], ishift) +
-                                                      self.solver.IsEqualCstVar(self.shift[(iworker, iday + 1)], ine_shift), 2))
-            self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                        self._brkWhereSet(iworker, iday, thisSoftConstraint))
-            self.brkconstraints_cost[self.nconstraints] = penalty
-            self.nconstraints += 1
+            self._addSoftConstraint(self.solver.IsEqualCstVar(self.solver.IsEqualCstVar(self.shift[(iworker, iday)], ishift) +
+                                                              self.solver.IsEqualCstVar(self.shift[(iworker, iday + 1)], ine_shift), 2),
+                                    thisSoftConstraint, iworker, iday, penalty)
+
+
+    def _workerLoad(self, iworker, days, weights):
+        """
+        :param weights: list with the weight of an assignment on every shift (e.g. its hours)
+        :return: expression with the weighted sum of the assignments of a worker on the days
+        """
+        variables = [self.assigned[(iworker, t, s, d)] for t in range(self.num_tasks)
+                                                       for s in range(self.num_shifts) for d in days]
+        coefs = [weights[s] for t in range(self.num_tasks) for s in range(self.num_shifts) for d in days]
+        return self.solver.ScalProd(variables, coefs)
+
+
+    def _loadBound(self, days, weights):
+        """
+        :return: max value of _workerLoad on the days, a single shift a day with avoidOvertime, else every shift
+        """
+        return len(days) * (max(weights or [0]) if self.avoidOvertime else sum(weights))
+
+
+    def _deviationBound(self, low, high, bounds):
+        """
+        :param bounds: (min, max) values of the expression
+        :return: max units of the expression out of low..high
+        """
+        return max(bounds[1] - high if high is not None else 0, low - bounds[0] if low is not None else 0, 0)
+
+
+    def _addSoftDeviation(self, expr, low, high, bounds, constraint, worker, day, penalty):
+        """
+        Add a soft constraint broken once for every unit of expr out of low..high, a single violation var
+        for any number of days so the model stays linear on the workers
+
+        :param low: min value of expr, None if there isn't
+        :param high: max value of expr, None if there isn't
+        :param bounds: (min, max) values of expr, for the domain of the violation var
+        :return: index of the soft constraint, None if there are no limits
+        """
+        if low is None and high is None:
+            return None
+        broken = 0
+        if high is not None:
+            broken = self.solver.Max(expr - high, broken)
+        if low is not None:
+            broken = self.solver.Max(low - expr, broken)
+        return self._addSoftConstraint(broken, constraint, worker, day, penalty,
+                                       upper=self._deviationBound(low, high, bounds))
+
+
+    def addSoft_TargetHoursToWorker(self, iworker, hours, penalty):
+        """
+        Hours of work of a worker on the roster (e.g. the HorasContrato not yet worked, HorasAcumuladas, up to
+        the end of the roster), with the hours of every shift on shiftHours
+
+        :param iworker: index for the worker
+        :param hours: target hours of the worker
+        :param penalty: the cost of every hour over or under the target
+        :return: void
+        """
+        thisSoftConstraint = 7  # internal index code constraint on the solver, must be > 0
+
+        days = range(self.num_days)
+        self._addSoftDeviation(self._workerLoad(iworker, days, self.shiftHours), hours, hours,
+                               (0, self._loadBound(days, self.shiftHours)), thisSoftConstraint, iworker, 0, penalty)
+
+
+    def addSoft_ShiftsPerPeriodToWorker(self, iworker, minshifts, maxshifts, previous, penalty):
+        """
+        Min and max shifts of a worker on every period of periodDays days. The first period started periodStart
+        days before the roster, with previous shifts already worked. The min only applies to the periods that
+        end on the roster
+
+        :param iworker: index for the worker
+        :param minshifts: min shifts of a period, None if there isn't
+        :param maxshifts: max shifts of a period, None if there isn't
+        :param previous: shifts worked on the first period before the first day
+        :param penalty: the cost of every shift out of minshifts..maxshifts
+        :return: void
+        """
+        thisSoftConstraint = 8  # internal index code constraint on the solver, must be > 0
+
+        ones = [1] * self.num_shifts
+        first = 0
+        while first < self.num_days:
+            last = first + self.periodDays - (self.periodStart if first == 0 else 0)
+            days = range(first, min(last, self.num_days))
+            expr = self._workerLoad(iworker, days, ones)
+            before = previous if first == 0 else 0
+            if before:
+                expr = expr + before
+            self._addSoftDeviation(expr, minshifts if last <= self.num_days else None, maxshifts,
+                                   (before, before + self._loadBound(days, ones)), thisSoftConstraint, iworker,
+                                   first, penalty)
+            first = last
+
+
+    def addSoft_FairShifts(self, penalty):
+        """
+        Balance the workload, the shifts of every worker should be the mean shifts of the workers (the
+        requirements are exact, so the mean is known before the search), the one of the whole roster on a
+        component or a window of it (fairnessMean)
+
+        :param penalty: the cost of every shift of a worker away from the mean
+        :return: void
+        """
+        thisSoftConstraint = 9  # internal index code constraint on the solver, must be > 0
+
+        ones = [1] * self.num_shifts
+        days = range(self.num_days)
+        for w in range(1, self.num_workers):
+            low, high = self._fairShifts(w)
+            self._addSoftDeviation(self._workerLoad(w, days, ones), low, high,
+                                   (0, self._loadBound(days, ones)), thisSoftConstraint, w, 0, penalty)
+
+
+    def _fairShifts(self, iworker):
+        """
+        :return: (low, high) shifts of a worker around the mean shifts of the workers (see addSoft_FairShifts)
+        """
+        if self.fairnessMean is not None:
+            mean = round(self.fairnessMean[iworker], 6)
+            return int(np.floor(mean)), int(np.ceil(mean))
+        total = int(np.sum(self.dayRequirements))
+        workers = self.num_workers - 1
+        return total // workers, -(-total // workers)
 
 
     def addSoft_MaxConsecutiveWorkingDays(self, maxwdays, penalty):
@@ -743,11 +1479,7 @@ class SchedulingSolver:
                 if (dini + maxwdays) < self.num_days:
                     temp = [self.isworkingday[(w, dini + d)] for d in range(maxwdays + 1)]
 
-                    self.solver.Add(self.brkconstraints[self.nconstraints] == 1 * (self.solver.Sum(temp) > maxwdays))
-                    self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                                    self._brkWhereSet(w, dini, thisSoftConstraint))
-                    self.brkconstraints_cost[self.nconstraints] = penalty
-                    self.nconstraints += 1
+                    self._addSoftConstraint(1 * (self.solver.Sum(temp) > maxwdays), thisSoftConstraint, w, dini, penalty)
 
 
     def addSoft_MinNonWorkingDays(self, minnwdays, lapse_days, penalty):
@@ -763,7 +1495,7 @@ class SchedulingSolver:
         thisSoftConstraint = 6  # internal index code constraint on the solver, must be > 0
 
         if lapse_days < 2:
-            print ("Day time lapse too short!, can't add soft constraint")
+            self.log.warning("Day time lapse too short!, can't add soft constraint")
 
         lapse_days= lapse_days -1
 
@@ -776,11 +1508,7 @@ class SchedulingSolver:
                 if (dini + lapse_days) < self.num_days:
                     temp = [self.isworkingday[(w, dini + d)] == 0 for d in range(lapse_days + 1)]
 
-                    self.solver.Add(self.brkconstraints[self.nconstraints] == 1 * (self.solver.Sum(temp) < minnwdays))
-                    self.solver.Add(self.brkconstraints_where[self.nconstraints] == self.brkconstraints[self.nconstraints] *
-                                    self._brkWhereSet(w, dini, thisSoftConstraint))
-                    self.brkconstraints_cost[self.nconstraints] = penalty
-                    self.nconstraints += 1
+                    self._addSoftConstraint(1 * (self.solver.Sum(temp) < minnwdays), thisSoftConstraint, w, dini, penalty)
 
 
     def ComposeDb(self):
@@ -790,123 +1518,266 @@ class SchedulingSolver:
           first_solution.AddObjective(objective_var)
           store_db = solver.StoreAssignment(first_solution)
           first_solution_db = solver.Compose([assign_db, store_db])
-          print('searching for initial solution,', end=' ')
+          self.log.debug('searching for initial solution')
           solver.Solve(first_solution_db)
-          print('initial cost =', first_solution.ObjectiveValue())
+          self.log.debug('initial cost = %i', first_solution.ObjectiveValue())
         """
 
 
-    def createDecisionBuilderPhase(self, choose_type=solver.CHOOSE_RANDOM):
+    def createDecisionBuilderPhase(self, choose_type=pywrapcp.Solver.CHOOSE_RANDOM, value_type=None):
+        """
+        Create the decision builder
+
+        :param choose_type: variable selection strategy (ChooseTypeDb)
+        :param value_type: value selection strategy (solver.ASSIGN_*), None keeps the historical phase
+                           where choose_type is given as the value strategy (see ChooseTypeDb)
+        :return: void
+        """
 
         # Create the decision builder.
         #vars = self.tasks_flat + self.shifts_flat
         variables = self.assignations
-        self.db = self.solver.Phase(variables, self.solver.ASSIGN_MIN_VALUE, choose_type)
+        if value_type is None:
+            # historical argument order: first unbound var (ASSIGN_MIN_VALUE == CHOOSE_FIRST_UNBOUND) and
+            # choose_type as value strategy, kept so the results of the existing requests don't change
+            self.db = self.solver.Phase(variables, self.solver.ASSIGN_MIN_VALUE, choose_type)
+        else:
+            self.db = self.solver.Phase(variables, choose_type, value_type)
 
+        # Warm-start: the left-most leaf of the search is the previous roster, the values that are
+        # not feasible anymore are refuted and the rest of the tree is explored with the phase
+        if self.hint is not None:
+            hint = self.solver.Assignment()
+            hint.Add(variables)
+            for var, value in self._hintValues():
+                hint.SetValue(var, value)
+            self.db = self.solver.DecisionBuilderFromAssignment(hint, self.db, variables)
 
         #TODO : Create composed db for both assignment problems shefts and tasks
 
 
-    def searchSolutionsCollector(self, dsol, toScreen=True):
+    def searchSolutions(self, dsol, toScreen=True, onSolution=None):
         """
-        Search solutions using collector
+        Search solutions with the search mode of the request
 
+        :param onSolution: function(cost, nsolution) called for every improving solution found
         :return: dsol: solution number to display
         """
+        if self.searchMode == 'lns':
+            return self.searchSolutionsLns(dsol, toScreen, onSolution)
+        return self.searchSolutionsCollector(dsol, toScreen, onSolution)
 
-        # Create a solution collector.
-        if toScreen: print ("Searching solutions for max %i seconds..." %(self.C_TIMELIMIT/1000))
 
-        collector = self.solver.LastSolutionCollector()
-        collector.Add(self.assignations)
-        collector.Add(self.workers_task_day_flat)
-        #collector.Add(self.assigned_worker_flat)
+    def searchSolutionsCollector(self, dsol, toScreen=True, onSolution=None):
+        """
+        Search solutions using collector
 
-        #collector.Add(self.workers_flat)
+        :param onSolution: function(cost, nsolution) called for every improving solution found
+        :return: dsol: solution number to display
+        """
+
+        # Create a solution collector.
+        self.log.info("Searching solutions for max %i seconds...", self.timeLimit/1000)
 
-        for c in range(self.nconstraints):
-            collector.Add(self.brkconstraints[c])
-            collector.Add(self.brkconstraints_where[c])
+        collector = self._createCollector()
 
         # Add the objective and solve
 
         self.objective = self.solver.Minimize(self.cost, 1)
-        collector.AddObjective(self.cost)
 
         #solution_limit = self.solver.SolutionsLimit(1000)
-        self.time_limit = self.solver.TimeLimit(self.C_TIMELIMIT)
+        self.time_limit = self.solver.TimeLimit(self.timeLimit)
 
-        self.solver.Solve(self.db, [self.objective, self.time_limit, collector] )
+        self.metrics = SearchMetrics(self.solver, self.cost)
+        self.stagnation = StagnationLimit(self.solver, self.cost, self.stallTime, self.stallBranches, self.lowerBound)
 
-        found = collector.SolutionCount()
-        if found >0:
-            cost = collector.ObjectiveValue(0)
-        else:
-            cost = -1
+        monitors = [self.objective, self.time_limit, collector, self.metrics, self.stagnation] + self.monitors
+        if onSolution is not None:
+            monitors.append(SolutionCallback(self.solver, self.cost, onSolution))
 
-        if toScreen==False:
-            return cost;
+        self.solver.Solve(self.db, monitors)
 
-        print("Solutions found:", found)
-        print("Time:", self.solver.WallTime(), "ms")
-        print()
-        
-        if found > 0:
-            best_solution = collector.SolutionCount() - 1
-            jsonResult = self.showSolutionWorkersToScreen(dsol, collector.ObjectiveValue(best_solution), collector)
-            self.showSolutionToScreen(dsol, collector.ObjectiveValue(best_solution), collector)
-        else:
-            print ("No solutions found on time limit ", (self.C_TIMELIMIT / 1000), " sec, try to revise hard constraints.")
-            jsonResult = {
-                          "Error" :1
-                        }
-        return jsonResult
+        return self._reportSolutions(collector, dsol, toScreen)
 
 
-    def showSolutionToScreen(self, dsoln, dcost,collector=None):
+    def searchSolutionsLns(self, dsol, toScreen=True, onSolution=None):
         """
-        Show a solution scheduler to the screen
+        Search solutions using Large Neighbourhood Search, the first solution is found with the
+        decision builder and then improved relaxing fragments of the roster (see ScheduleLns).
+        The search restarts from the best solution with a new random seed every C_LNSRESTART ms
+        until the time limit, the lower bound of the cost or the stagnation of the search (see StagnationLimit)
 
-        :param
-            dsoln: number of the solution to display
-            dcost: cost of the solution found
-        :return: exit code  0: stop search manually
-                            1: no solutions found
+        :param onSolution: function(cost, nsolution) called for every improving solution found
+        :return: dsol: solution number to display
         """
-        day_str = " "
-        shf_str = ""
-        linea = "_______________"
-        barra = ""
-        print("Solution number ", str(dsoln), "Cost=", str(dcost), '\n')
 
-        for i in range(self.num_days):
-            day_str = day_str + "Day" + str(i) + "    |     "
+        self.log.info("Searching solutions with LNS for max %i seconds...", self.timeLimit/1000)
+
+        variables = self.assignations
+        self.objective = self.solver.Minimize(self.cost, 1)
+        self.metrics = SearchMetrics(self.solver, self.cost)
+        self.stagnation = StagnationLimit(self.solver, self.cost, self.stallTime, self.stallBranches, self.lowerBound)
+        callback = [self.metrics, self.stagnation]
+        if onSolution is not None:
+            callback.append(SolutionCallback(self.solver, self.cost, onSolution))
+        deadline = self.solver.WallTime() + self.timeLimit
+
+        # first solution
+        best = self.solver.Assignment()
+        best.Add(variables)
+        best.AddObjective(self.cost)
+        first_db = self.solver.Compose([self.db, self.solver.StoreAssignment(best)])
+        found = self.solver.Solve(first_db, [self.solver.TimeLimit(self.timeLimit)] + callback)
+
+        # To search a fragment we use a randomized decision builder limited by the number of failures
+        inner_db = self.solver.Phase(variables, self.solver.CHOOSE_RANDOM, self.solver.ASSIGN_MIN_VALUE)
+        continuation_db = self.solver.SolveOnce(inner_db, [self.solver.FailuresLimit(self.C_LNSFAILLIMIT)])
+        rand = random.Random(self.C_LNSSEED)
+
+        while found and not self.stagnation.stalled() and self.solver.WallTime() < deadline:
+            operator = ScheduleLns(variables, self.num_workers, self._lnsTasks(), self.num_shifts, self.num_days,
+                                   random.Random(rand.random()), self.C_LNSFRAGMENT)
+            parameters = self.solver.LocalSearchPhaseParameters(operator, continuation_db)
+            lns_db = self.solver.LocalSearchPhase(best, parameters)
+
+            collector = self.solver.LastSolutionCollector()
+            collector.Add(variables)
+            collector.AddObjective(self.cost)
+            restart_limit = self.solver.TimeLimit(min(self.C_LNSRESTART, deadline - self.solver.WallTime()))
+            self.solver.Solve(lns_db, [self.objective, restart_limit, collector] + callback)
+
+            if collector.SolutionCount() > 0 and collector.ObjectiveValue(0) < best.ObjectiveValue():
+                for var in variables:
+                    best.SetValue(var, collector.Value(0, var))
+                best.SetObjectiveValue(collector.ObjectiveValue(0))
+
+        # restore the best solution to collect all the vars shown on the results
+        collector = self._createCollector()
+        if found:
+            self.solver.Solve(self.solver.RestoreAssignment(best), [collector])
+
+        return self._reportSolutions(collector, dsol, toScreen)
+
+
+    def _createCollector(self):
+        """
+        Create the collector for the last solution with all the vars shown on the results
+
+        :return: SolutionCollector
+        """
+        collector = self.solver.LastSolutionCollector()
+        collector.Add(self.assignations)
+        collector.Add(self.workers_task_day_flat)
+        #collector.Add(self.assigned_worker_flat)
+
+        #collector.Add(self.workers_flat)
+
+        collector.Add(self.brkconstraints)
+
+        collector.AddObjective(self.cost)
+        return collector
+
+
+    def _reportSolutions(self, collector, dsol, toScreen=True):
+        """
+        Show the best solution of the collector, the JSON result has the metrics of the search on "Metrics"
+        (see SearchMetrics)
+
+        :return: dict with the JSON result, or the cost of the solution (-1 if none) when toScreen is False
+        """
+        found = collector.SolutionCount()
+        if found >0:
+            cost = collector.ObjectiveValue(0)
+        else:
+            cost = -1
+
+        metrics = self.metrics.toJSON() if self.metrics is not None else {}
+        logEvent(self.log, 'search', Mode=self.searchMode, Solutions=metrics.get("Solutions", found), Cost=cost,
+                 Ms=metrics.get("WallTime"), Branches=metrics.get("Branches"), Failures=metrics.get("Failures"),
+                 TimeToFirst=metrics.get("TimeToFirst"), TimeToBest=metrics.get("TimeToBest"),
+                 TimeLimit=self.timeLimit, Stop=self._stopReason(metrics))
+
+        if toScreen==False:
+            return cost;
+
+        if found > 0:
+            best_solution = collector.SolutionCount() - 1
+            assigned = self.solution = self._assignedArray(collector, dsol)
+            jsonResult = self.showSolutionWorkersToScreen(dsol, collector.ObjectiveValue(best_solution), collector,
+                                                          assigned=assigned)
+            jsonResult["LowerBound"] = self.lowerBound
+            if self.log.isEnabledFor(logging.INFO):
+                self.showSolutionToScreen(dsol, collector.ObjectiveValue(best_solution), collector, assigned=assigned)
+        else:
+            self.log.warning("No solutions found on time limit %i sec, try to revise hard constraints.",
+                             self.timeLimit / 1000)
+            jsonResult = {
+                          "Error" :1
+                        }
+        if self.metrics is not None:
+            jsonResult["Metrics"] = dict(metrics, Mode=self.searchMode, TimeLimit=self.timeLimit,
+                                         Stop=self._stopReason(metrics))
+        return jsonResult
+
+
+    def _stopReason(self, metrics):
+        """
+        Why the last search has finished: 'bound' (the lower bound of the cost is reached), 'stagnation',
+        'timeLimit' or 'complete' (the whole search tree has been explored)
+
+        :param metrics: dict with the metrics of the search (see SearchMetrics)
+        :return: string with the reason
+        """
+        if self.stagnation is not None and self.stagnation.reason is not None:
+            return self.stagnation.reason
+        if metrics.get("WallTime", 0) >= self.timeLimit:
+            return 'timeLimit'
+        return 'complete'
+
+
+    def showSolutionToScreen(self, dsoln, dcost,collector=None, assigned=None):
+        """
+        Show a solution scheduler to the screen (INFO log)
+
+        :param
+            dsoln: number of the solution to display
+            dcost: cost of the solution found
+            assigned: array of the solution from _assignedArray, read from the collector if None
+        :return: exit code  0: stop search manually
+                            1: no solutions found
+        """
+        if assigned is None:
+            assigned = self._assignedArray(collector, dsoln)
+        counts = assigned[1:].sum(axis=0)  # workers for every (task, shift, day)
+
+        day_str = " "
+        shf_str = ""
+        linea = "_______________"
+        barra = ""
+        self.log.info("Solution number %s Cost=%s", dsoln, dcost)
+
+        for i in range(self.num_days):
+            day_str = day_str + "Day" + str(i) + "    |     "
             for s in range(self.num_shifts):
                 shf_str = shf_str + self.nameShifts[s][:3] + " "
             shf_str = shf_str + "| "
             barra += linea
-        print("             ", day_str)
-        print("          ", shf_str)
-        print(barra)
+        self.log.info("              %s", day_str)
+        self.log.info("           %s", shf_str)
+        self.log.info(barra)
 
         for j in range(self.num_tasks):
             shift_str = self.nameTasks[j][:7] + self.space(5)
             for d in range(self.num_days):
                 for s in range(self.num_shifts):
-                    n=0
-                    for w in range(1,self.num_workers):
-                        a = collector.Value(dsoln, self.assigned[w,j,s,d])
-                        if (a>0):
-                            #print ("assigned [%i,%i,%i,%i]" %(w,j,s,d))
-                            n += 1
-                    shift_str = shift_str + str(n)
+                    shift_str = shift_str + str(counts[j, s, d])
                     if s < self.num_shifts-1:
                         shift_str += self.space(3)
                     else:
                         shift_str += self.space(2)
                 shift_str = shift_str + "|"+ self.space(2)
 
-            print(shift_str)
+            self.log.info(shift_str)
 
         # show braked constraints (soft)
 
@@ -916,26 +1787,24 @@ class SchedulingSolver:
                 for s in range(self.num_shifts):
                     v = collector.Value(dsoln, self.assigned_worker[w,t,s])
                     if v > 0:
-                        print ("Debug Task %i, Shift %i, worker = %i on day(%i)" %(t,s,w,v))
+                        self.log.debug("Debug Task %i, Shift %i, worker = %i on day(%i)", t, s, w, v)
         """
         # show braked constraints (soft)
-        print("---------------------------------------------------------------------------")
+        self.log.info("---------------------------------------------------------------------------")
         cons_count = 0
         for n in range (self.nconstraints):
             cons=collector.Value(dsoln, self.brkconstraints[n])
-            where=collector.Value(dsoln, self.brkconstraints_where[n])
-            #print (where)
 
-            if cons == 1:
+            if cons >= 1:
                 cons_count = cons_count +1
-                print ("%i. Breaked %s with cost %i" % (cons_count, self._brkWhereGet(where),
-                        self.brkconstraints_cost[n]) )
+                self.log.info("%i. Breaked %s with cost %i", cons_count, self._brkWhereGet(n),
+                              cons * self.softconstraints.penalty[n])
         if self.nconstraints == 0:
             perc=0
         else:
             perc = 100*cons_count/self.nconstraints
-        print("Breaked soft constraints: %i of %i inserted constraints (%.1f%%)\n" %
-              (cons_count, self.nconstraints, perc))
+        self.log.info("Breaked soft constraints: %i of %i inserted constraints (%.1f%%)",
+                      cons_count, self.nconstraints, perc)
         """
         while(True):
             r = input("Do you want to show workers for task on day? (Y/N)")
@@ -948,8 +1817,8 @@ class SchedulingSolver:
                             for s in range(self.num_shifts):
                                 a = collector.Value(dsoln, self.assigned[w, t, s, d])
                                 if a > 0:
-                                    print("[worker %i (%s), task= %i (%s), shift= %i (%s) ,day %i]" %
-                                          (w, self.nameWorkers[w]['Name'], t, self.nameTasks[t], s, self.nameShifts[s], d))
+                                    self.log.info("[worker %i (%s), task= %i (%s), shift= %i (%s) ,day %i]",
+                                                  w, self.nameWorkers[w]['Name'], t, self.nameTasks[t], s, self.nameShifts[s], d)
                 # ---debug max consecutive days worker for worker
                 c = 0
                 w = 1
@@ -966,25 +1835,31 @@ class SchedulingSolver:
                                     m = c
                             if a == 0 and ld != d:
                                 c = 0
-                print ("Worker %i, has %i consecutive days" %(w,m))
+                self.log.debug("Worker %i, has %i consecutive days", w, m)
 
                 return (0)
         """
 
 
-    def showSolutionWorkersToScreen(self, dsoln, dcost,collector=None):
+    def showSolutionWorkersToScreen(self, dsoln, dcost,collector=None, toScreen=True, assigned=None):
         """
 
         Show the workers scheduling setup
 
-        :return: void
+        :param toScreen: False to build the JSON result only, without logging it
+        :param assigned: array of the solution from _assignedArray, read from the collector if None
+        :return: dict with the JSON result
         """
+        if assigned is None:
+            assigned = self._assignedArray(collector, dsoln)
+        counts = assigned[1:].sum(axis=0)  # workers for every (task, shift, day)
 
         day_str = " "
         shf_str = ""
         linea = "________________"
         barra = ""
-        print("Solution number ", str(dsoln), "Cost=", str(dcost), '\n')
+        toScreen = toScreen and self.log.isEnabledFor(logging.INFO)
+        if toScreen: self.log.info("Solution number %s Cost=%s", dsoln, dcost)
         shifts = []
         for i in range(self.num_days):
             day_str = day_str + "Day" + str(i) + "    |     "
@@ -994,22 +1869,14 @@ class SchedulingSolver:
                  shifts.append(self.nameShifts[s])
             shf_str = shf_str + "| "
             barra += linea
-        print("             ", day_str)
-        print("          ", shf_str)
-        print(barra)
+        if toScreen:
+            self.log.info("              %s", day_str)
+            self.log.info("           %s", shf_str)
+            self.log.info(barra)
         tasks, workersList = [], []
 
         for j in range(self.num_tasks):
-            mt = 0
-            for d in range(self.num_days):
-                for s in range(self.num_shifts):
-                    n = 0
-                    for w in range(1, self.num_workers):
-                        a = collector.Value(dsoln, self.assigned[w, j, s, d])
-                        if (a > 0):
-                            # print ("assigned [%i,%i,%i,%i]" %(w,j,s,d))
-                            n += 1
-                            mt = max(mt,n)
+            mt = int(counts[j].max()) if counts[j].size else 0
             # then now we know the max number of task to create (mt)
             for m in range(1, mt+1):
                 shift_str = self.nameTasks[j][:7] + "[" + str(m) + "] "
@@ -1018,25 +1885,39 @@ class SchedulingSolver:
                 for d in range(self.num_days):
                     worker = []
                     for s in range(self.num_shifts):
-                        strw= self._findWorker(m,d,s,j, dsoln,collector)
+                        strw= self._findWorker(m,d,s,j, assigned)
                         worker.append(strw)
                         shift_str += strw[:3]+ self.space(1)
                     shift_str += "|" + self.space(1)
                     workers.append(worker)
                 workersList.append(workers)
-                print(shift_str)
+                if toScreen: self.log.info(shift_str)
         data = {
              "Tasks" : tasks,
              "Workers": workersList,
              "Shifts": shifts,
              "NoOfDays": self.num_days,
+             "Cost": dcost,
              "Error":0
         }
         return data
 
 
+    def currentRoster(self, dcost, nsolution):
+        """
+        JSON result of the solution being accepted by the search, to be called from a search monitor
+
+        :param dcost: cost of the solution
+        :param nsolution: number of the solution
+        :return: dict with the JSON result
+        """
+        roster = self.showSolutionWorkersToScreen(nsolution, dcost, CurrentSolution(), toScreen=False)
+        roster["Solution"] = nsolution
+        return roster
+
+
 
-    def _findWorker(self, num, d, s, t, dsoln, collector=None):
+    def _findWorker(self, num, d, s, t, assigned):
         """
         Find num (firths, second,.. ) from the day, shift, and task assigned to work
 
@@ -1044,111 +1925,2051 @@ class SchedulingSolver:
         :param d:
         :param s:
         :param t:
-        :param dsoln:
-        :param collector:
+        :param assigned: array of the solution from _assignedArray
         :return:
         """
-        encontrado = False
-        strw = "---"
-        n = 0
+        workers = np.flatnonzero(assigned[1:, t, s, d])
+        if num <= len(workers):
+            return self.nameWorkers[workers[num - 1] + 1]['Name']
+        return "---"
+
+
+    def _assignedArray(self, collector, dsoln):
+        """
+        Read all the decision vars of a solution of the collector at once, every report of the solution
+        is built from this array instead of calling collector.Value for every cell
+
+        :return: numpy array [worker, task, shift, day] with 1 if the worker does the task on the shift and day
+        """
+        values = [collector.Value(dsoln, var) for var in self.assignations]
+        return np.array(values, dtype=np.int8).reshape(self.num_workers, self.num_tasks, self.num_shifts,
+                                                        self.num_days)
+
+
+    def _hintValues(self):
+        """
+        Values of the decision vars for the previous roster loaded on self.hint
+
+        :return: iterator of (var, value)
+        """
+        for key, var in self.assigned.items():
+            yield var, 1 if key in self.hint else 0
+
+
+    def _lnsTasks(self):
+        """
+        Number of tasks on the layout of the decision vars (see ScheduleLns)
+        """
+        return self.num_tasks
+
+
+    def modelStats(self):
+        """
+        Size of the model built on the solver
+
+        :return: dict with the number of variables and constraints of the model
+        """
+        variables = (len(self.assigned) + len(self.num_workers_task_day) + len(self.tot_workers_day) +
+                     len(self.workers_task_day) + len(self.isworkingday) + len(self.brkconstraints) + 1)
+        return {"Variables": variables, "Constraints": self.solver.Constraints()}
+
+
+    def freeSolver(self):
+        """
+        Release the solver and all the Ortools vars of the model, the instance can't be used to
+        solve again after calling it
+
+        :return: void
+        """
+        self.db = None
+        self.objective = None
+        self.time_limit = None
+        self.metrics = None
+        self.stagnation = None
+        self.solution = None
+        self.assigned = {}
+        self.assignations = []
+        self.num_workers_task_day = {}
+        self.tot_workers_day = {}
+        self.workers_task_day = {}
+        self.workers_task_day_flat = []
+        self.isworkingday = {}
+        self.brkconstraints = []
+        self.cost = None
+        self.solver = None
+
+
+class CompactSchedulingSolver(SchedulingSolver):
+    """
+    Scheduling solver with a compact model, the same public API of SchedulingSolver but instead of the
+    0/1 assigned[(worker, task, shift, day)] grid (and its workers_task_day products and AllDifferent
+    constraints) there is one integer slot[(worker, shift, day)] = 0 (not working) or task + 1,
+    so a worker can't do two tasks on the same shift by construction
+    """
+
+    def __init__(self, requestid=None):
+        SchedulingSolver.__init__(self, requestid)
+        self.slot = {}
+        self.working = {}
+
+
+    def definedModel(self):
+        """
+        Define de model, initialice Ortools vars
+        :return: void
+        """
+        # slot[(worker, shift, day)] = 0 not working, task + 1 working on the task
+        self.slot = {}
+
+        for w in range(self.num_workers):
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    self.slot[(w, s, d)] = self.solver.IntVar(0, self.num_tasks, "slot(%i,%i,%i)" % (w, s, d))
+
+        self.assignations = [self.slot[(w, s, d)] for w in range(self.num_workers)
+                                                  for s in range(self.num_shifts)
+                                                  for d in range(self.num_days)]
+
+        # working[(worker, shift, day)] = 1/0 the worker works on the shift
+        self.working = {}
+
+        for w in range(self.num_workers):
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    self.working[(w, s, d)] = self.solver.IsDifferentCstVar(self.slot[(w, s, d)], 0)
+
+        # num_workers_task_day[(task, shift, day)] = num workers
+        self.num_workers_task_day = {}
+
+        for t in range(self.num_tasks):
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    a = self.solver.IntVar(0, self.C_MAXWORKERSTASKDAY, "worker(%i,%i,%i)" % (t, s, d))
+                    self.num_workers_task_day[(t, s, d)] = a
+                    self.solver.Add(self.solver.Count([self.slot[(w, s, d)] for w in range(1, self.num_workers)], t + 1, a))
+
+        # tot_workers_day[(day)] = Sum total number of workers assigned for a day
+        self.tot_workers_day = {}
+
+        for d in range(self.num_days):
+            a = self.solver.IntVar(0, self.C_MAXWORKERSTASKDAY, "totalworkersday(%i)" % d)
+            self.tot_workers_day[d] = a
+            self.solver.Add(self.solver.SumEquality([self.working[(w, s, d)] for w in range(1, self.num_workers)
+                                                                               for s in range(self.num_shifts)], a))
+
+        # isworkingday[(worker,day)] = 1/0  is or is not a working day for this worker
+        self.isworkingday = {}
+
+        for w in range(self.num_workers):
+            for d in range(self.num_days):
+                a = self.solver.IntVar(0, 1, "isworkingday(%i,%i)" % (w, d))
+                self.isworkingday[(w, d)] = a
+                self.solver.Add(a == self.solver.Max([self.working[(w, s, d)] for s in range(self.num_shifts)]))
+
+        self.mShowWorkers = []
+
+
+    def addHardAllDifferentWorkers_OnDay(self):
+        """
+        Constraint to ensure that a worker does a single task+shift on a Day
+
+        :return: void
+        """
+        self.log.debug("Setup HARD: All workers for a day must be different.")
         for w in range(1, self.num_workers):
-            a = collector.Value(dsoln, self.assigned[w, t, s, d])
-            if (a > 0):
-                encontrado = True
-                n += 1
-                if n == num:
-                    strw = self.nameWorkers[w]['Name']
-                    break
-        return strw
+            for d in range(self.num_days):
+                self.solver.Add(self.solver.Sum([self.working[(w, s, d)] for s in range(self.num_shifts)]) <= 1)
 
-def main():
 
-    cost =0
+    def addHardAllDifferentWorkersForTasks_OnDay(self):
+        """
+        A worker does a single task on a shift, the slot var already ensures it
 
-    #TODO: Falta procedimiento de Carga de empleados y planificaciones externas
+        :return: void
+        """
+        self.log.debug("Setup HARD: All workers for a day must be different.")
 
-    mysched = SchedulingSolver()
-    choose_types = ChooseTypeDb
-    data = {
-        "nameShifts" : ["MAN", "TAR", "NOC"],
-        "nameTasks": ['Operario','Supervisor', 'Revisor'],
-        "allWorkers": [{'ID':'001','Name': '---', 'ATasks': [0, 1, 2], 'AShifts': [0, 1, 2]},
-                            {'ID':'002','Name': 'Op1', 'ATasks': [0], 'AShifts': [0, 1]},
-                            {'ID':'003','Name': 'Op2', 'ATasks': [0], 'AShifts': [0, 1]},
-                            {'ID':'004','Name': 'Op3', 'ATasks': [0], 'AShifts': [0, 1, 2]},
-                            {'ID':'005','Name': 'Op4', 'ATasks': [0, 2], 'AShifts': [0, 1, 2]},
-                            {'ID':'006','Name': 'Op5', 'ATasks': [0], 'AShifts': [0, 1]},
-                            {'ID':'007','Name': 'Re1', 'ATasks': [0, 2], 'AShifts': [0, 2]},
-                            {'ID':'008','Name': 'Su1', 'ATasks': [1], 'AShifts': [0, 1, 2]},
-                            {'ID':'009','Name': 'Su2', 'ATasks': [1], 'AShifts': [0, 1, 2]},
-                            {'ID':'010','Name': 'Su3', 'ATasks': [1, 2], 'AShifts': [0, 2]}],
-        "allRequirements": [([2, 1, 0], [1, 1, 0], [0, 0, 0]),
-                                    ([1, 1, 0], [1, 1, 0], [0, 0, 0]),
-                                    ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
-                                    ([2, 1, 0], [1, 1, 0], [0, 0, 1]),
-                                    ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
-                                    ([3, 1, 1], [1, 1, 0], [0, 0, 1]),
-                                    ([2, 1, 1], [1, 1, 0], [0, 1, 1])]
-    }
-    mysched.loadJSONData(data)
-    mysched.definedModel()
-    mysched.hardConstraints()
-    mysched.softConstraints()
-    mysched.calculateCost()
-    mysched.createDecisionBuilderPhase(choose_types.CHOOSE_MIN_SIZE_LOWEST_MIN.value)
-    cost=mysched.searchSolutionsCollector(0)
 
-    exit(0)
+    def addHardLeaveRequests(self):
+        """
+        Leave requests of SchedulingSolver only forbid two tasks on the same shift for the worker, the slot
+        var already ensures it
 
-class MyServer(BaseHTTPServer.BaseHTTPRequestHandler):
+        :return: void
+        """
+        self.log.debug("Setup HARD: All leave requests should be accomodated.")
 
-    def do_POST(self):
 
-        # print("\n----- Request Start ----->\n")
-        # request_path = s.path
+    def addHardAllowedTasksForWorker(self, iworker, atasks):
+        """
+        Set the allowed tasks for a especific worker
+        :param iworker:  The worker index
+        :param atasks: The tasks array to set
+        :return: void
+        """
+        if iworker == 0:
+            return
 
-        # print(request_path)
-        
-        # request_headers = s.headers
-        # content_length = request_headers.getheaders('content-length')
-        # length = int(content_length[0]) if content_length else 0
-        
-        # print(request_headers)
-        # print(s.rfile.read(length))
-        # print("<----- Request End -----\n")
+        _notallowed = [t for t in self.allowedtasks if t not in atasks]
+        self.log.debug("Setup HARD: Worker %i, not allowed to tasks=%s", iworker, _notallowed)
 
+        for t in _notallowed:
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    self.slot[(iworker, s, d)].RemoveValue(t + 1)
 
-        """Respond to a POST request."""
 
-        # Extract and print the contents of the POST
-        # length = int(s.headers['Content-Length'])
-        # post_data = urlparse.parse_qs(s.rfile.read(length).decode('utf-8'))
-        # data = json.loads(post_data['json'][0])
-        # data = json.loads(request.body)
+    def addSoft_AllowedShiftsToWorker(self, iworker, ashift, penalty):
+        """
+        Set for a set of alloweds shifts
+
+        :param iworker: index for the worker
+        :param ashift: a list of allowed shifts indexes
+        :param penalty: the cost for to broke this constraint
+        :return: void
+        """
+        thisSoftConstraint = 2  # internal index code constraint on the solver, must be > 0
 
-        data_string = self.rfile.read(int(self.headers['Content-Length']))
-        data = json.loads(data_string)
+        _notallowed = [s for s in self.allowedshifts if s not in ashift]
 
-        #TODO: Falta procedimiento de Carga de empleados y planificaciones externas
+        if len(_notallowed) == 0:
+            return 0
 
-        mysched = SchedulingSolver()
-        choose_types = ChooseTypeDb
-        mysched.loadJSONData(data)
-        mysched.definedModel()
-        mysched.hardConstraints()
-        mysched.softConstraints()
-        mysched.calculateCost()
-        mysched.createDecisionBuilderPhase(choose_types.CHOOSE_MIN_SIZE_LOWEST_MIN.value)
-        cost=mysched.searchSolutionsCollector(0)
+        for i in range(self.num_days):
+            temp = [self.working[(iworker, s, i)] for s in _notallowed]
+            self._addSoftConstraint(self.solver.Max(temp), thisSoftConstraint, iworker, i, penalty)
 
-        # print(cost)
-        dump = json.dumps(cost)
-        self.send_response(200)
+
+    def _assignedArray(self, collector, dsoln):
+        slots = np.array([collector.Value(dsoln, var) for var in self.assignations], dtype=np.int32)
+        slots = slots.reshape(self.num_workers, self.num_shifts, self.num_days)
+        assigned = np.zeros((self.num_workers, self.num_tasks, self.num_shifts, self.num_days), dtype=np.int8)
+        w, s, d = np.nonzero(slots)
+        assigned[w, slots[w, s, d] - 1, s, d] = 1
+        return assigned
+
+
+    def _hintValues(self):
+        tasks = dict(((w, s, d), t + 1) for (w, t, s, d) in self.hint)
+        for key, var in self.slot.items():
+            yield var, tasks.get(key, 0)
+
+
+    def _workerRow(self, iworker):
+        return [self.slot[(iworker, s, d)] for s in range(self.num_shifts) for d in range(self.num_days)]
+
+
+    def _workerHintRow(self, iworker):
+        tasks = dict(((w, s, d), t + 1) for (w, t, s, d) in self.hint if w == iworker)
+        return [tasks.get((iworker, s, d), 0) for s in range(self.num_shifts) for d in range(self.num_days)]
+
+
+    def _workerLoad(self, iworker, days, weights):
+        variables = [self.working[(iworker, s, d)] for s in range(self.num_shifts) for d in days]
+        coefs = [weights[s] for s in range(self.num_shifts) for d in days]
+        return self.solver.ScalProd(variables, coefs)
+
+
+    def _lnsTasks(self):
+        return 1
+
+
+    def modelStats(self):
+        stats = SchedulingSolver.modelStats(self)
+        stats["Variables"] += len(self.slot) + len(self.working)
+        return stats
+
+
+    def freeSolver(self):
+        self.slot = {}
+        self.working = {}
+        SchedulingSolver.freeSolver(self)
+
+
+class MipSchedulingSolver(SchedulingSolver):
+    """
+    Scheduling solver with the same model as a mixed integer program solved by CBC (pywraplp), the same
+    public API of SchedulingSolver. There are 0/1 assigned[(worker, task, shift, day)] vars only for the
+    allowed tasks of the workers, the counts are linear expressions and isworkingday[(worker, day)] and
+    the broken AShifts are bounded from below by the assigned vars. The search modes of the constraint
+    solver don't apply (checkRequest rejects them), CBC searches until the optimum or the time limit and
+    a previous roster is not a warm start, it is flagged on the metrics ("WarmStart": "ignored")
+    """
+
+    def __init__(self, requestid=None):
+        SchedulingSolver.__init__(self, requestid)
+        self.solver = pywraplp.Solver("schedule_shifts_tasks", pywraplp.Solver.CBC_MIXED_INTEGER_PROGRAMMING)
+        self.exactdays = set()  # (worker, day) with isworkingday also <= its assigned vars, see _addForbiddenSequence
+
+
+    def definedModel(self):
+        """
+        Define de model, initialice the MIP vars
+        :return: void
+        """
+        # assigned[(worker, task, shift, day)] = 0/1, only for the allowed tasks of the worker (see addHardAllowedTasksForWorker)
+        self.assigned = {}
+
+        for w in range(1, self.num_workers):
+            for t in sorted(set(self.nameWorkers[w]['ATasks'])):
+                for s in range(self.num_shifts):
+                    for d in range(self.num_days):
+                        self.assigned[(w, t, s, d)] = self.solver.BoolVar("assigned(%i,%i,%i,%i)" % (w, t, s, d))
+
+        self.assignations = list(self.assigned.values())
+
+        # num_workers_task_day[(task, shift, day)] = num workers
+        self.num_workers_task_day = {}
+
+        for t in range(self.num_tasks):
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    self.num_workers_task_day[(t, s, d)] = self.solver.Sum(
+                        [self.assigned[(w, t, s, d)] for w in range(1, self.num_workers) if (w, t, s, d) in self.assigned])
+
+        # tot_workers_day[(day)] = Sum total number of workers assigned for a day
+        self.tot_workers_day = {}
+
+        for d in range(self.num_days):
+            self.tot_workers_day[d] = self.solver.Sum([self.num_workers_task_day[(t, s, d)] for t in range(self.num_tasks)
+                                                                                          for s in range(self.num_shifts)])
+
+        # isworkingday[(worker,day)] = 1 if the worker works on the day, it is >= the assigned vars of the day so
+        # it may be 1 on a free day too, it is made exact only where a rest day matters (see _addForbiddenSequence)
+        self.isworkingday = {}
+
+        for w in range(1, self.num_workers):
+            for d in range(self.num_days):
+                a = self.solver.BoolVar("isworkingday(%i,%i)" % (w, d))
+                self.isworkingday[(w, d)] = a
+                self._addAtLeastOne(a, self._workerVars(w, d))
+
+        self.mShowWorkers = []
+
+
+    def _workerVars(self, iworker, iday, shifts=None):
+        """
+        :return: list with the assigned vars of a worker on a day (and shifts, all by default)
+        """
+        shifts = range(self.num_shifts) if shifts is None else shifts
+        return [self.assigned[(iworker, t, s, iday)] for t in range(self.num_tasks) for s in shifts
+                if (iworker, t, s, iday) in self.assigned]
+
+
+    def _addAtLeastOne(self, var, variables):
+        """
+        var is 1 if any of the assigned vars of a worker on a day is 1, with avoidOvertime at most one of
+        them is 1 so a single constraint with their sum is enough (and tighter on the LP relaxation)
+
+        :return: void
+        """
+        if self.avoidOvertime:
+            self.solver.Add(var >= self.solver.Sum(variables))
+        else:
+            for v in variables:
+                self.solver.Add(var >= v)
+
+
+    def _addSoftConstraint(self, broken, constraint, worker, day, penalty, upper=1):
+        """
+        Add a soft constraint to the model, broken is its violation var (0/1, up to upper)
+
+        :return: index of the soft constraint
+        """
+        n = self.nconstraints
+        self.brkconstraints.append(broken)
+        self.softconstraints.append(constraint, worker, day, penalty)
+        self.maxcost += penalty * upper
+        self.nconstraints += 1
+        return n
+
+
+    def addHardAllDifferentWorkers_OnDay(self):
+        """
+        Constraint to ensure that a worker does a single task+shift on a Day
+
+        :return: void
+        """
+        self.log.debug("Setup HARD: All workers for a day must be different.")
+        for w in range(1, self.num_workers):
+            for d in range(self.num_days):
+                self.solver.Add(self.solver.Sum(self._workerVars(w, d)) <= 1)
+
+
+    def addHardAllDifferentWorkersForTasks_OnDay(self):
+        """
+        Constraint to ensure that a worker does a single task on a shift
+
+        :return: void
+        """
+        self.log.debug("Setup HARD: All workers for a day must be different.")
+        for w in range(1, self.num_workers):
+            for s in range(self.num_shifts):
+                for d in range(self.num_days):
+                    self.solver.Add(self.solver.Sum(self._workerVars(w, d, [s])) <= 1)
+
+
+    def addHardLeaveRequests(self):
+        """
+        Leave requests of SchedulingSolver only forbid two tasks on the same shift for the worker
+
+        :return: void
+        """
+        self.log.debug("Setup HARD: All leave requests should be accomodated: %s", self.leaveRequests)
+        for r in self.leaveRequests:
+            self.solver.Add(self.solver.Sum(self._workerVars(r[0], r[1], [r[2]])) <= 1)
+
+
+    def addHardAllowedTasksForWorker(self, iworker, atasks):
+        """
+        The vars of the not allowed tasks of the workers are not created (see definedModel)
+
+        :return: void
+        """
+
+
+    def addHardTotalWorkers_OnDay(self, nworkers, iday):
+        """
+        The total number of workers of a day is the sum of its requirements, only check there are enough workers
+
+        :raise InfeasibleError: if there are not enough workers for the day
+        """
+        if nworkers > (self.num_workers-1):
+            raise InfeasibleError("allRequirements[%i]" % iday,
+                                  "More workers are required to assign on day %i, required at least %i." %
+                                  (iday, nworkers))
+
+
+    def _workerRow(self, iworker):
+        return [self.assigned[(iworker, t, s, d)] for t in range(self.num_tasks)
+                                                  for s in range(self.num_shifts)
+                                                  for d in range(self.num_days) if (iworker, t, s, d) in self.assigned]
+
+
+    def _workerLoad(self, iworker, days, weights):
+        return self.solver.Sum([weights[s] * var for d in days for s in range(self.num_shifts)
+                                for var in self._workerVars(iworker, d, [s])])
+
+
+    def _addSoftDeviation(self, expr, low, high, bounds, constraint, worker, day, penalty):
+        """
+        The violation var is only bounded from below by the deviations, the cost is minimized
+
+        :return: index of the soft constraint, None if there are no limits
+        """
+        if low is None and high is None:
+            return None
+        upper = self._deviationBound(low, high, bounds)
+        broken = self.solver.IntVar(0, upper, "brk %i" % self.nconstraints)
+        if high is not None:
+            self.solver.Add(broken >= expr - high)
+        if low is not None:
+            self.solver.Add(broken >= low - expr)
+        return self._addSoftConstraint(broken, constraint, worker, day, penalty, upper)
+
+
+    def _addRowOrder(self, iworker1, iworker2):
+        """
+        A lexicographic order is weak on the LP relaxation, the rows are ordered by their number of
+        assignments instead, every roster has a permutation of its workers with that order
+
+        :return: void
+        """
+        self.solver.Add(self.solver.Sum(self._workerRow(iworker1)) >= self.solver.Sum(self._workerRow(iworker2)))
+
+
+    def addHardShiftRules(self):
+        """
+        There is no automaton on the MIP solver, every rule of the workers (see workerRules) is posted as
+        linear constraints on the windows of days
+
+        :return: void
+        :raise RequestError: a rule is not valid
+        """
+        self.exactdays = set()
+        for rules, workers in self._ruleWorkers():
+            try:
+                automaton = ShiftRules(self.nameShifts, rules, self.avoidOvertime)
+            except ValueError as e:
+                raise RequestError("shiftRules", str(e))
+            for kind, args in automaton.rules:
+                if kind == 'maxConsecutive':
+                    self.addHard_MaxConsecutiveWorkingDays(args[0], workers)
+                elif kind == 'minRest':
+                    self.addHard_MinNonWorkingDays(args[0], args[1], workers)
+                else:
+                    for w in workers:
+                        self._addForbiddenSequence(w, args[0], automaton.symbols)
+
+
+    def _addForbiddenSequence(self, iworker, days, symbols):
+        """
+        The days of a forbid rule (see ShiftRules) can't all match on any consecutive days of a worker
+
+        :param days: list with the set of symbols of every day of the sequence
+        :param symbols: number of symbols of a day
+        :return: void
+        """
+        before = self.initialDays[iworker] if self.initialDays else []
+        for dini in range(-min(len(before), len(days) - 1), self.num_days - len(days) + 1):
+            # the days before the first day (initialDays) must match for the sequence to go on the roster
+            if any(before[len(before) + dini + n] not in days[n] for n in range(max(-dini, 0))):
+                continue
+            matches = []
+            for n, day in enumerate(days):
+                d = dini + n
+                if d < 0 or (0 in day and len(day) > symbols):  # before the roster or any day
+                    continue
+                if day == frozenset([0]):
+                    # isworkingday may be 1 on a free day, a non working day needs it <= the assigned vars too
+                    if (iworker, d) not in self.exactdays:
+                        self.solver.Add(self.isworkingday[(iworker, d)] <= self.solver.Sum(self._workerVars(iworker, d)))
+                        self.exactdays.add((iworker, d))
+                    matches.append(1 - self.isworkingday[(iworker, d)])
+                elif self.avoidOvertime and len(day) < symbols:
+                    matches.append(self.solver.Sum(self._workerVars(iworker, d, [symbol - 1 for symbol in day
+                                                                                if symbol < symbols])))
+                else:
+                    matches.append(self.isworkingday[(iworker, d)])
+            self.solver.Add(self.solver.Sum(matches) <= len(matches) - 1)
+
+
+    def addSoft_AllowedShiftsToWorker(self, iworker, ashift, penalty):
+        """
+        Set for a set of alloweds shifts
+
+        :param iworker: index for the worker
+        :param ashift: a list of allowed shifts indexes
+        :param penalty: the cost for to broke this constraint
+        :return: void
+        """
+        thisSoftConstraint = 2  # internal index code constraint on the solver, must be > 0
+
+        _notallowed = [s for s in self.allowedshifts if s not in ashift]
+
+        if len(_notallowed) == 0:
+            return 0
+
+        for i in range(self.num_days):
+            temp = self._workerVars(iworker, i, _notallowed)
+            if not temp:
+                continue
+            brk = self.solver.BoolVar("brk %i" % self.nconstraints)
+            self._addAtLeastOne(brk, temp)
+            self._addSoftConstraint(brk, thisSoftConstraint, iworker, i, penalty)
+
+
+    def calculateCost(self):
+        """
+        Calculate the total cost of the broken constraints
+
+        :return: void
+        """
+        self.cost = self.solver.IntVar(0, min(self.maxcost, self.C_MAXCOST), "cost")
+        self.solver.Add(self.cost == self.solver.Sum([penalty * brk for brk, penalty in
+                                                      zip(self.brkconstraints, self.softconstraints.penalty)]))
+
+
+    def createDecisionBuilderPhase(self, choose_type=None, value_type=None):
+        """
+        CBC has its own search, there is no decision builder
+
+        :return: void
+        """
+
+
+    def searchSolutions(self, dsol, toScreen=True, onSolution=None):
+        return self.searchSolutionsCollector(dsol, toScreen, onSolution)
+
+
+    def searchSolutionsCollector(self, dsol, toScreen=True, onSolution=None):
+        """
+        Search the optimal solution with CBC until the time limit
+
+        :param onSolution: function(cost, nsolution) called with the solution found, at the end of the search
+        :return: dict with the JSON result, or the cost of the solution (-1 if none) when toScreen is False
+        """
+        self.log.info("Searching solutions with the MIP solver for max %i seconds...", self.timeLimit/1000)
+
+        self.solver.Minimize(self.cost)
+        self.solver.set_time_limit(self.timeLimit)
+        status = self.solver.Solve()
+        found = status in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE)
+        cost = int(round(self.cost.solution_value())) if found else -1
+
+        metrics = {"WallTime": self.solver.wall_time(), "Nodes": self.solver.nodes(),
+                   "Iterations": self.solver.iterations(), "Solutions": 1 if found else 0, "Mode": "mip",
+                   "TimeLimit": self.timeLimit,
+                   "Stop": 'bound' if status == pywraplp.Solver.OPTIMAL else
+                           'timeLimit' if self.solver.wall_time() >= self.timeLimit else 'complete'}
+        if self.hint is not None:
+            # CBC has no warm start, the previous roster of the request isn't tried by the search
+            self.log.warning("The previous roster is not a warm start of the MIP solver")
+            metrics["WarmStart"] = "ignored"
+        logEvent(self.log, 'search', Mode="mip", Solutions=metrics["Solutions"], Cost=cost, Ms=metrics["WallTime"],
+                 Nodes=metrics["Nodes"], TimeLimit=self.timeLimit, Stop=metrics["Stop"])
+
+        if found:
+            self.solution = np.zeros((self.num_workers, self.num_tasks, self.num_shifts, self.num_days), dtype=np.int8)
+            for key, var in self.assigned.items():
+                if var.solution_value() > 0.5:
+                    self.solution[key] = 1
+            if onSolution is not None:
+                onSolution(cost, 1)
+
+        if toScreen==False:
+            return cost
+
+        if found:
+            jsonResult = self.showSolutionWorkersToScreen(dsol, cost, MipSolution(), assigned=self.solution)
+            # the bound of CBC is at least the cut of addCostLowerBound
+            jsonResult["LowerBound"] = max(self.lowerBound, int(np.ceil(self.solver.Objective().BestBound() - 1e-6)))
+            if self.log.isEnabledFor(logging.INFO):
+                self.showSolutionToScreen(dsol, cost, MipSolution(), assigned=self.solution)
+        else:
+            self.log.warning("No solutions found on time limit %i sec, try to revise hard constraints.",
+                             self.timeLimit / 1000)
+            jsonResult = {
+                          "Error" :1
+                        }
+        jsonResult["Metrics"] = metrics
+        return jsonResult
+
+
+    def currentRoster(self, dcost, nsolution):
+        roster = self.showSolutionWorkersToScreen(nsolution, dcost, MipSolution(), toScreen=False,
+                                                  assigned=self.solution)
+        roster["Solution"] = nsolution
+        return roster
+
+
+    def modelStats(self):
+        return {"Variables": self.solver.NumVariables(), "Constraints": self.solver.NumConstraints()}
+
+
+
+
+def newSchedulingSolver(data):
+    """
+    Create the solver for the model of the request, "model": "full" (SchedulingSolver, default)
+    or "compact" (CompactSchedulingSolver), or "engine": "mip" (MipSchedulingSolver) for the MIP
+    solver instead of the constraint solver ("cp", default), "requestId" is the correlation id of
+    its log records
+
+    :param data: dict with the JSON request
+    :return: SchedulingSolver
+    """
+    if data.get('engine') == 'mip':
+        return MipSchedulingSolver(data.get('requestId'))
+    if data.get('model') == 'compact':
+        return CompactSchedulingSolver(data.get('requestId'))
+    return SchedulingSolver(data.get('requestId'))
+
+
+def checkRequest(data):
+    """
+    Validate a scheduling request before building its model, the fields needed by loadJSONData and the
+    problems found by FeasibilityChecker
+
+    :param data: dict with the JSON request
+    :return: void
+    :raise RequestError: the request is malformed
+    :raise InfeasibleError: the request has no solution
+    """
+    if not isinstance(data, dict):
+        raise RequestError("request", "The request must be a JSON object")
+    missing = [k for k in SchedulingSolver.C_REQUESTFIELDS if k not in data]
+    if missing:
+        raise RequestError(", ".join(missing), "Missing fields on the request", missing)
+    for k in ('nameShifts', 'nameTasks', 'allWorkers', 'allRequirements'):
+        if not isinstance(data[k], list) or not data[k]:
+            raise RequestError(k, "%s must be a non empty list" % k)
+    if not isinstance(data['avoidOvertime'], bool):
+        raise RequestError("avoidOvertime", "avoidOvertime must be a bool")
+    maxwdays = data['maxConsecutiveWorkingDays']
+    if maxwdays is not None and (not isinstance(maxwdays, int) or isinstance(maxwdays, bool) or maxwdays < 0):
+        raise RequestError("maxConsecutiveWorkingDays", "maxConsecutiveWorkingDays must be a non negative int")
+    nworkers, ndays, ntasks, nshifts = (len(data['allWorkers']), len(data['allRequirements']), len(data['nameTasks']),
+                                        len(data['nameShifts']))
+    for w, worker in enumerate(data['allWorkers']):
+        if not isinstance(worker, dict):
+            raise RequestError("allWorkers[%i]" % w, "The worker %i must be a JSON object" % w)
+        missing = [k for k in SchedulingSolver.C_WORKERFIELDS if k not in worker]
+        if missing:
+            raise RequestError("allWorkers[%i]" % w, "Missing fields on the worker %i" % w, missing)
+        for k, n in (('ATasks', ntasks), ('AShifts', nshifts)):
+            # the worker 0 (not assigned) isn't constrained, its indexes aren't used (see taskComponents)
+            if not isinstance(worker[k], list) or w > 0 and (len(set(worker[k])) != len(worker[k]) or any(
+                    not isinstance(i, int) or isinstance(i, bool) or not 0 <= i < n for i in worker[k])):
+                raise RequestError("allWorkers[%i].%s" % (w, k), "%s must be a list of different indexes from 0 to %i"
+                                   % (k, n - 1))
+    leave = data['leaveRequests']
+    if not isinstance(leave, list) or any(not isinstance(r, list) or len(r) != 3 or
+                                          any(not isinstance(i, int) or isinstance(i, bool) for i in r) or
+                                          not (0 <= r[0] < nworkers and 0 <= r[1] < ndays and 0 <= r[2] < nshifts)
+                                          for r in leave):
+        raise RequestError("leaveRequests", "leaveRequests must be a list of [worker, day, shift] indexes")
+    if data.get('engine', 'cp') not in SchedulingSolver.C_ENGINES:
+        raise RequestError("engine", "Unknown engine %s" % data['engine'], list(SchedulingSolver.C_ENGINES))
+    if data.get('engine') == 'mip' and data.get('searchMode', 'tree') != 'tree':
+        raise RequestError("searchMode", "searchMode only applies to the cp engine, the mip engine always searches with CBC")
+    for k in ('decompose', 'symmetryBreaking'):
+        if not isinstance(data.get(k, True), bool):
+            raise RequestError(k, "%s must be a bool" % k)
+    for k in ('timeLimit', 'stallTime', 'stallBranches', 'windowDays', 'windowTimeLimit', 'frozenDays', 'periodDays',
+              'periodStart', 'workloadPenalty', 'shiftsPenalty', 'fairnessPenalty'):
+        if data.get(k) is not None and (not isinstance(data[k], int) or isinstance(data[k], bool) or data[k] < 0):
+            raise RequestError(k, "%s must be a non negative int" % k)
+    if data.get('periodStart') and data['periodStart'] >= (data.get('periodDays') or len(data['allRequirements'])):
+        raise RequestError("periodStart", "periodStart must be less than periodDays")
+    hours = data.get('shiftHours')
+    if hours is not None and (not isinstance(hours, list) or len(hours) != len(data['nameShifts']) or
+                              any(not isinstance(h, int) or h < 0 for h in hours)):
+        raise RequestError("shiftHours", "shiftHours must be a non negative int for every shift")
+    rules = [("shiftRules", data.get('shiftRules'))] + [("allWorkers[%i].ShiftRules" % w, worker.get('ShiftRules'))
+                                                        for w, worker in enumerate(data['allWorkers'])]
+    for field, value in rules:
+        if value is not None and not isinstance(value, list):
+            raise RequestError(field, "The shift rules must be a list of rules")
+        try:
+            ShiftRules(data['nameShifts'], value or [], data['avoidOvertime'])
+        except ValueError as e:
+            raise RequestError(field, str(e))
+    for w, worker in enumerate(data['allWorkers']):
+        for k in SchedulingSolver.C_WORKLOADFIELDS:
+            if worker.get(k) is not None and (not isinstance(worker[k], int) or isinstance(worker[k], bool) or
+                                              worker[k] < 0):
+                raise RequestError("allWorkers[%i].%s" % (w, k), "%s must be a non negative int" % k)
+        if worker.get('MinShifts') is not None and worker.get('MaxShifts') is not None and \
+                worker['MinShifts'] > worker['MaxShifts']:
+            raise RequestError("allWorkers[%i].MinShifts" % w, "MinShifts must be less or equal than MaxShifts")
+    if data.get('windowDays') and data.get('searchMode') == 'portfolio':
+        raise RequestError("searchMode", "The portfolio search can't solve a roster by windows (windowDays)")
+    if data.get('frozenDays') and not (data.get('previousSolution') or data.get('previousAssigned')):
+        raise RequestError("frozenDays", "The frozen days are taken from previousSolution or previousAssigned")
+    initial = data.get('initialWorkingDays')
+    if initial is not None and (not isinstance(initial, list) or len(initial) != len(data['allWorkers']) or
+                                any(not isinstance(n, int) or n < 0 for n in initial)):
+        raise RequestError("initialWorkingDays", "initialWorkingDays must be a non negative int for every worker")
+    mean = data.get('fairnessMean')
+    if mean is not None and (not isinstance(mean, list) or len(mean) != len(data['allWorkers']) or
+                             any(not isinstance(n, (int, float)) or isinstance(n, bool) or n < 0 for n in mean)):
+        raise RequestError("fairnessMean", "fairnessMean must be a non negative number for every worker")
+    days = data.get('initialDays')
+    symbols = len(data['nameShifts']) if data['avoidOvertime'] else 1
+    if days is not None and (not isinstance(days, list) or len(days) != len(data['allWorkers']) or
+                             any(not isinstance(d, list) or any(not isinstance(n, int) or not 0 <= n <= symbols
+                                                                for n in d) for d in days)):
+        raise RequestError("initialDays", "initialDays must be a list of days for every worker, 0 not working, "
+                                          "else the shift + 1 (1 without avoidOvertime)")
+
+    problems = FeasibilityChecker(data).check()
+    malformed = [p for p in problems if p['Check'] in FeasibilityChecker.C_REQUESTCHECKS]
+    if malformed:
+        raise RequestError("allRequirements", malformed[0]['Message'], malformed)
+    if problems:
+        for problem in problems:
+            log.info("Infeasible request: %s", problem['Message'])
+        raise InfeasibleError("allRequirements", "The request has no solution", problems)
+
+
+def fairnessMean(data):
+    """
+    Mean shifts of the workers on the whole roster (see addSoft_FairShifts), the same for every worker
+
+    :param data: dict with the JSON request
+    :return: list with the mean shifts of every worker (worker 0 included)
+    """
+    workers = len(data['allWorkers']) - 1
+    mean = float(np.sum(data['allRequirements'])) / workers if workers > 0 else 0.0
+    return [mean] * (workers + 1)
+
+
+def solveSchedule(data, choose_type=ChooseTypeDb.CHOOSE_MIN_SIZE_LOWEST_MIN.value, onSolution=None, onRoster=None,
+                  check=True, processes=multiprocessing.cpu_count()):
+    """
+    Solve a scheduling request on a fresh solver, the solver is released when done
+
+    :param data: dict with the JSON request (see loadJSONData)
+    :param choose_type: variable selection strategy for the decision builder
+    :param onSolution: function(cost, nsolution) called for every improving solution found
+    :param onRoster: function(roster) called with the JSON result of every improving solution found
+    :param check: validate the request first, False if it is already validated (see MyServer.solveRequest)
+    :param processes: max number of solver processes of the request (components, portfolio members)
+    :return: dict with the JSON result
+    :raise RequestError: the request is malformed or it has no solution (InfeasibleError), see checkRequest
+    """
+    if check:
+        checkRequest(data)
+
+    if data.get('fairnessPenalty') and not data.get('fairnessMean'):
+        # the components and the windows of the roster are balanced around the mean of the whole roster
+        data = dict(data, fairnessMean=fairnessMean(data))
+
+    components = taskComponents(data) if data.get('decompose', True) else []
+    if len(components) > 1:
+        return solveComponents(data, components, choose_type, onSolution, onRoster, processes)
+
+    if data.get('windowDays'):
+        return solveRolling(data, choose_type, onSolution, onRoster)
+
+    if data.get('searchMode') == 'portfolio':
+        return solvePortfolio(data, processes, first=data.get('portfolioResult') == 'first',
+                              onSolution=onSolution, onRoster=onRoster)
+
+    mysched = newSchedulingSolver(data)
+
+    def solutionFound(cost, nsolution):
+        if onSolution is not None:
+            onSolution(cost, nsolution)
+        if onRoster is not None:
+            onRoster(mysched.currentRoster(cost, nsolution))
+
+    try:
+        mysched.buildModel(data)
+        mysched.createDecisionBuilderPhase(choose_type)
+        if onSolution is None and onRoster is None:
+            return mysched.searchSolutions(0)
+        return mysched.searchSolutions(0, onSolution=solutionFound)
+    finally:
+        mysched.freeSolver()
+
+
+def portfolioMembers(size):
+    """
+    Search strategies of a portfolio, the historical phase first, then every ChooseTypeDb variable
+    strategy assigning the max value, then CHOOSE_RANDOM with different seeds
+
+    :param size: number of members
+    :return: list of (name, choose_type, value_type, seed)
+    """
+    members = [("LEGACY", ChooseTypeDb.CHOOSE_MIN_SIZE_LOWEST_MIN.value, None, 0)]
+    members += [(c.name, c.value, pywrapcp.Solver.ASSIGN_MAX_VALUE, 0) for c in ChooseTypeDb]
+    seed = 1
+    while len(members) < size:
+        members.append(("CHOOSE_RANDOM#%i" % seed, ChooseTypeDb.CHOOSE_RANDOM.value,
+                        pywrapcp.Solver.ASSIGN_RANDOM_VALUE, seed))
+        seed += 1
+    return members[:size]
+
+
+def _runPortfolioMember(data, member, bound, first, queue):
+    """
+    Solve a request with one strategy of a portfolio on a solver process, the JSON result of every improving
+    solution is sent too, it is the result of the portfolio if no member ends its search on the deadline
+
+    :param member: (name, choose_type, value_type, seed)
+    :param bound: multiprocessing.Value with the best cost found by the portfolio
+    :param first: stop at the first solution
+    :param queue: multiprocessing.Queue to put the ('progress'|'roster'|'done'|'failed', (name, value)) messages
+    :return: void
+    """
+    name, choose_type, value_type, seed = member
+    mysched = newSchedulingSolver(data)
+
+    def onSolution(cost, nsolution):
+        with bound.get_lock():
+            if cost >= bound.value:
+                return
+            bound.value = cost
+        queue.put(('progress', (name, cost)))
+        roster = mysched.currentRoster(cost, nsolution)
+        roster["LowerBound"] = mysched.lowerBound
+        queue.put(('roster', (name, roster)))
+
+    try:
+        mysched.buildModel(data)
+        mysched.createDecisionBuilderPhase(choose_type, value_type)
+        if seed:
+            mysched.solver.ReSeed(seed)
+        mysched.db = SharedBoundDb(mysched.db, mysched.cost, bound)
+        if first:
+            mysched.monitors.append(mysched.solver.SolutionsLimit(1))
+        queue.put(('done', (name, mysched.searchSolutionsCollector(0, onSolution=onSolution))))
+    except Exception as e:
+        queue.put(('failed', (name, str(e))))
+    finally:
+        mysched.freeSolver()
+
+
+def solvePortfolio(data, size=multiprocessing.cpu_count(), first=False, onSolution=None, onRoster=None):
+    """
+    Solve the request with several search strategies in parallel processes (see portfolioMembers),
+    the processes share the best cost found so far to bound their search
+
+    :param data: dict with the JSON request
+    :param size: number of strategies (processes)
+    :param first: return the first solution found instead of the best one within the time limit
+    :param onSolution: function(cost, nsolution) called for every improving solution found
+    :param onRoster: function(roster) called with the JSON result of every improving solution found
+    :return: dict with the JSON result, "Strategy" is the name of the winner strategy, it is the best roster
+             sent by the strategies if none ends its search with a better one before the deadline
+    """
+    bound = multiprocessing.Value('i', SchedulingSolver.C_MAXCOST + 1)
+    queue = multiprocessing.Queue()
+    processes = []
+    for member in portfolioMembers(size):
+        process = multiprocessing.Process(target=_runPortfolioMember,
+                                          args=(data, member, bound, first, queue))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    # the members stop on their own time limit, the grace covers the building of the models
+    deadline = time.time() + SchedulingSolver.searchLimits(data)[0] / 1000.0 + SchedulingSolver.C_PORTFOLIOGRACE
+    best = None
+    best_roster = None  # the result if no member ends on the deadline (e.g. a slow build of the models)
+    best_cost = bound.value
+    nsolutions = 0
+    pending = len(processes)
+    try:
+        while pending > 0 and time.time() < deadline:
+            try:
+                msg, (name, value) = queue.get(timeout=min(1, max(0, deadline - time.time())))
+            except Queue.Empty:
+                if any(p.is_alive() for p in processes):
+                    continue
+                try:
+                    # a process may put its last messages right before exiting
+                    msg, (name, value) = queue.get_nowait()
+                except Queue.Empty:
+                    break
+            if msg == 'progress':
+                # messages of different processes may arrive out of order
+                if value < best_cost:
+                    best_cost = value
+                    nsolutions += 1
+                    if onSolution is not None:
+                        onSolution(value, nsolutions)
+            elif msg == 'roster':
+                if value["Cost"] <= best_cost:
+                    value["Strategy"] = name
+                    best_roster = value
+                    if onRoster is not None:
+                        onRoster(value)
+            else:
+                pending -= 1
+                if msg == 'done' and value.get("Error") == 0 and (best is None or value["Cost"] < best["Cost"]):
+                    best = value
+                    best["Strategy"] = name
+                # no member can improve a solution on the lower bound of the cost (see addCostLowerBound)
+                if best is not None and (first or best["Cost"] <= best.get("LowerBound", 0)):
+                    break
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    if best is None or (best_roster is not None and best_roster["Cost"] < best["Cost"]):
+        if best_roster is None:
+            return {"Error": 1}
+        best = best_roster
+        best["Metrics"] = {"Mode": "portfolio", "Stop": "timeLimit"}
+    return best
+
+
+def _windowRequest(data, first, last, assigned, hint):
+    """
+    Request of the days first..last-1 of a rolling roster, with the consecutive working days of every worker
+    at the end of the roster already assigned on the previous days. The workload of the workers couples the
+    windows: the TargetHours not worked yet are shared out between the days left, and the periods of the
+    MinShifts and MaxShifts go on with the shifts worked on the previous windows (PeriodShifts)
+
+    :param assigned: numpy array [worker, task, shift, day] of the whole roster
+    :param hint: set of the (w,t,s,d) of the previous roster, None if there isn't
+    :return: dict with the JSON request of the window
+    """
+    working = assigned[:, :, :, :first].any(axis=(1, 2))  # [worker, day]
+    initial = data.get('initialWorkingDays') or [0] * assigned.shape[0]
+    trailing = [0]
+    for w in range(1, assigned.shape[0]):
+        days = working[w][::-1]
+        trailing.append(int(np.argmin(days)) if not days.all() else len(days) + initial[w])
+
+    ndays = assigned.shape[3]
+    hours = np.array(data.get('shiftHours') or [SchedulingSolver.C_SHIFTHOURS] * assigned.shape[2])
+    worked = (assigned[:, :, :, :first].sum(axis=(1, 3)) * hours).sum(axis=1)  # [worker]
+    period = data.get('periodDays') or ndays
+    start = (data.get('periodStart', 0) + first) % period  # days of the current period before the window
+    shifts = assigned[:, :, :, max(first - start, 0):first].sum(axis=(1, 2, 3))  # [worker]
+    workers = [data['allWorkers'][0]]
+    for w, worker in enumerate(data['allWorkers'][1:], 1):
+        worker = dict(worker)
+        if worker.get('MinShifts') is not None or worker.get('MaxShifts') is not None:
+            worker['PeriodShifts'] = int(shifts[w]) + (worker.get('PeriodShifts', 0) if first < start else 0)
+        if worker.get('TargetHours') is not None:
+            worker['TargetHours'] = max(int(round(float(worker['TargetHours'] - worked[w]) * (last - first) /
+                                                  (ndays - first))), 0)
+        workers.append(worker)
+    # the shifts away from the mean of the whole roster are shared out between the days left too
+    mean = data.get('fairnessMean')
+    if mean:
+        done = assigned[:, :, :, :first].sum(axis=(1, 2, 3))  # [worker]
+        mean = [max(float(mean[w] - done[w]) * (last - first) / (ndays - first), 0) for w in range(len(mean))]
+
+    # the days before the window for the shiftRules, 0 not working, else the shift + 1 (1 without avoidOvertime)
+    symbols = assigned[:, :, :, :first].any(axis=1)  # [worker, shift, day]
+    if data['avoidOvertime']:
+        symbols = (symbols * np.arange(1, assigned.shape[2] + 1)[None, :, None]).max(axis=1)
+    else:
+        symbols = symbols.any(axis=1).astype(np.int64)
+    previous = data.get('initialDays') or [[]] * assigned.shape[0]
+    days = [(list(previous[w]) + [int(n) for n in symbols[w]])[-ShiftRules.C_MAXLAPSE:]
+            for w in range(assigned.shape[0])]
+
+    return dict(data, allWorkers=workers, periodDays=period, periodStart=start, initialDays=days, fairnessMean=mean,
+                allRequirements=data['allRequirements'][first:last],
+                leaveRequests=[[r[0], r[1] - first, r[2]] for r in data['leaveRequests'] if first <= r[1] < last],
+                previousAssigned=[[w, t, s, d - first] for (w, t, s, d) in hint or () if first <= d < last],
+                previousSolution=None, initialWorkingDays=trailing, windowDays=None, frozenDays=0)
+
+
+def solveRolling(data, choose_type=ChooseTypeDb.CHOOSE_MIN_SIZE_LOWEST_MIN.value, onSolution=None, onRoster=None):
+    """
+    Solve a long roster window by window of "windowDays" days (rolling horizon), every window is a model of
+    its own days that starts from the consecutive working days of the workers at the end of the previous
+    windows, so the size of the models doesn't grow with the horizon. The first "frozenDays" days are
+    already published, they are taken as they are from the previous roster (previousSolution or
+    previousAssigned) and not solved again. Every window is solved for C_TIMELIMIT or "windowTimeLimit" (ms),
+    the "timeLimit" of the request is the deadline of the whole roster, every window gets what is left of it
+    divided by the windows left (see searchLimits). The cost of the result is the cost of the soft constraints
+    of the whole roster (see rosterCost), as if it had been solved on a single model
+
+    :param data: dict with the JSON request
+    :param choose_type: variable selection strategy for the decision builder
+    :param onSolution: function(cost, nwindow) called with the cost of the roster when a window is solved
+    :param onRoster: function(roster) called with the JSON result of the roster when a window is solved
+    :return: dict with the JSON result, "Metrics" has the metrics of every window
+    """
+    start = time.time()
+    deadline = start + SchedulingSolver.searchLimits(data)[0] / 1000.0
+    roster = newSchedulingSolver(data)  # only the data of the whole roster, for its JSON result
+    try:
+        roster.loadJSONData(data)
+        ndays = roster.num_days
+        frozen = min(data.get('frozenDays', 0), ndays)
+        assigned = np.zeros((roster.num_workers, roster.num_tasks, roster.num_shifts, ndays), dtype=np.int8)
+        for w, t, s, d in roster.hint or ():
+            if d < frozen:
+                assigned[w, t, s, d] = 1
+        cost = bound = roster.shiftsCost(assigned[:, :, :, :frozen])
+
+        windows = []
+        for first in range(frozen, ndays, data['windowDays']):
+            last = min(first + data['windowDays'], ndays)
+            left = -(-(ndays - first) // data['windowDays'])
+            window = _windowRequest(data, first, last, assigned, roster.hint)
+            window['timeLimit'] = max(int(min((deadline - time.time()) * 1000 / left,
+                                              data.get('windowTimeLimit') or SchedulingSolver.C_TIMELIMIT)), 1)
+            mysched = newSchedulingSolver(data)
+            try:
+                mysched.buildModel(window)
+                mysched.createDecisionBuilderPhase(choose_type)
+                result = mysched.searchSolutions(0)
+                windows.append({"FirstDay": first, "Days": last - first, "Cost": result.get("Cost"),
+                                "Metrics": result.get("Metrics")})
+                if result.get("Error") != 0:
+                    roster.log.warning("No solution for the days %i to %i of the roster", first, last - 1)
+                    return {"Error": 1, "Metrics": {"Mode": "rolling", "Windows": windows}}
+                assigned[:, :, :, first:last] = mysched.solution
+            finally:
+                mysched.freeSolver()
+
+            cost += result["Cost"]
+            bound += result.get("LowerBound", 0)
+            if onSolution is not None:
+                onSolution(cost, len(windows))
+            if onRoster is not None:
+                partial = roster.showSolutionWorkersToScreen(len(windows), cost, toScreen=False, assigned=assigned)
+                partial["Solution"] = len(windows)
+                onRoster(partial)
+
+        # the windows only count the workload of their own days, the roster counts it on all of them
+        cost = roster.rosterCost(assigned)
+        jsonResult = roster.showSolutionWorkersToScreen(0, cost, toScreen=False, assigned=assigned)
+        jsonResult["LowerBound"] = bound
+        metrics = [w["Metrics"] or {} for w in windows]
+        jsonResult["Metrics"] = dict([(k, sum([m.get(k) or 0 for m in metrics]))
+                                      for k in ("Branches", "Failures", "Solutions")],
+                                     Mode="rolling", WallTime=int((time.time() - start) * 1000), Windows=windows,
+                                     Stop='complete')
+        return jsonResult
+    finally:
+        roster.freeSolver()
+
+
+def taskComponents(data):
+    """
+    Connected components of the graph of the workers and their ATasks, the workers of different components
+    never do the same tasks so every component is an independent roster
+
+    :param data: dict with the JSON request
+    :return: list of (tasks, workers) of every component, sorted lists of indexes (worker 0 is excluded)
+    """
+    parent = list(range(len(data['nameTasks'])))
+
+    def find(t):
+        while parent[t] != t:
+            parent[t] = parent[parent[t]]
+            t = parent[t]
+        return t
+
+    for worker in data['allWorkers'][1:]:
+        for t in worker['ATasks'][1:]:
+            parent[find(t)] = find(worker['ATasks'][0])
+
+    components = {}
+    for t in range(len(parent)):
+        components.setdefault(find(t), ([], []))[0].append(t)
+    for w, worker in enumerate(data['allWorkers'][1:], 1):
+        if worker['ATasks']:
+            components[find(worker['ATasks'][0])][1].append(w)
+    return sorted(components.values())
+
+
+def _componentRequest(data, tasks, workers, hint):
+    """
+    Request of a component of the roster (see taskComponents), with the tasks and workers renumbered
+
+    :param tasks: list of the indexes of the tasks of the component
+    :param workers: list of the indexes of the workers of the component
+    :param hint: set of the (w,t,s,d) of the previous roster, None if there isn't
+    :return: dict with the JSON request of the component
+    """
+    newtask = dict((t, n) for n, t in enumerate(tasks))
+    newworker = dict((w, n) for n, w in enumerate([0] + workers))
+    allWorkers = [data['allWorkers'][0]] + [dict(data['allWorkers'][w],
+                                                 ATasks=[newtask[t] for t in data['allWorkers'][w]['ATasks']])
+                                            for w in workers]
+    request = dict(data,
+                   nameTasks=[data['nameTasks'][t] for t in tasks],
+                   allWorkers=allWorkers,
+                   allRequirements=[[day[t] for t in tasks] for day in data['allRequirements']],
+                   leaveRequests=[[newworker[r[0]]] + list(r[1:]) for r in data['leaveRequests'] if r[0] in newworker],
+                   previousAssigned=[[newworker[w], newtask[t], s, d] for (w, t, s, d) in hint or ()
+                                     if w in newworker and t in newtask],
+                   previousSolution=None, decompose=False)
+    for k in ('initialWorkingDays', 'initialDays', 'fairnessMean'):
+        if data.get(k):
+            request[k] = [data[k][w] for w in [0] + workers]
+    return request
+
+
+def _runComponent(n, data, choose_type, queue, rosters=False, processes=1):
+    """
+    Solve a component of a roster on a solver process
+
+    :param n: index of the component
+    :param queue: multiprocessing.Queue to put the ('roster'|'done'|'failed', (n, value)) messages
+    :param rosters: send also the JSON result of every improving solution
+    :param processes: max number of solver processes of the component (portfolio members)
+    :return: void
+    """
+    def onRoster(roster):
+        queue.put(('roster', (n, roster)))
+
+    try:
+        queue.put(('done', (n, solveSchedule(data, choose_type, onRoster=onRoster if rosters else None,
+                                             processes=processes))))
+    except GenericError as e:
+        queue.put(('failed', (n, e.toJSON())))
+    except Exception as e:
+        queue.put(('failed', (n, {"Error": 1, "Message": str(e)})))
+
+
+def _mergeComponents(data, components, demand, results):
+    """
+    Roster of a request from the rosters of its components (see solveComponents), every task belongs to a
+    single component so the rows of a task are taken from the roster of its component, and as the
+    requirements are exact a task has as many rows as its max requirement
+
+    :param components: list of (tasks, workers)
+    :param demand: numpy array [day, task, shift] with the requirements
+    :param results: dict index of the component -> its JSON result, for every component with requirements
+    :return: dict with the JSON result of the roster
+    """
+    tasks, workers = [], []
+    rows = dict((n, 0) for n in results)
+    component = dict((t, n) for n, (ts, ws) in enumerate(components) for t in ts)
+    for t in range(len(data['nameTasks'])):
+        n = component[t]
+        mt = int(demand[:, t].max()) if demand.size else 0
+        if mt == 0:
+            continue
+        tasks += results[n]["Tasks"][rows[n]:rows[n] + mt]
+        workers += results[n]["Workers"][rows[n]:rows[n] + mt]
+        rows[n] += mt
+
+    return {
+        "Tasks": tasks,
+        "Workers": workers,
+        "Shifts": list(data['nameShifts']),
+        "NoOfDays": len(data['allRequirements']),
+        "Cost": sum([r["Cost"] for r in results.values()]),
+        "Error": 0
+    }
+
+
+def solveComponents(data, components, choose_type=ChooseTypeDb.CHOOSE_MIN_SIZE_LOWEST_MIN.value, onSolution=None,
+                    onRoster=None, size=multiprocessing.cpu_count()):
+    """
+    Solve every component of a roster (see taskComponents) as a request of its own, in parallel processes
+    unless this is already a daemon process (the server pool), and merge their JSON results (see
+    _mergeComponents). The components started later share what is left of the time limit of the request,
+    so the request keeps its deadline when they are solved one after another
+
+    :param data: dict with the JSON request
+    :param components: list of (tasks, workers)
+    :param choose_type: variable selection strategy for the decision builder
+    :param onSolution: function(cost, ncomponents) called with the cost of the solved components
+    :param onRoster: function(roster) called with the JSON result of the roster for every improving solution
+                     of a component, once every component has a solution
+    :param size: max number of processes, shared by the components solved at the same time (portfolio members)
+    :return: dict with the JSON result, "Metrics" has the metrics of every component
+    """
+    start = time.time()
+    deadline = start + SchedulingSolver.searchLimits(data)[0] / 1000.0
+    roster = newSchedulingSolver(data)  # only to read the previous roster
+    try:
+        roster.loadJSONData(data)
+        hint = roster.hint
+    finally:
+        roster.freeSolver()
+
+    demand = np.array(data['allRequirements'], dtype=np.int64).reshape(len(data['allRequirements']),
+                                                                        len(data['nameTasks']), -1)
+    requests = {}
+    for n, (tasks, workers) in enumerate(components):
+        if demand[:, tasks].any():  # the workers of a component without requirements don't work
+            requests[n] = _componentRequest(data, tasks, workers, hint)
+
+    def limited(n, left, slots):
+        # the components not started yet (left) are solved on rounds of slots at the same time
+        rounds = -(-left // slots)
+        return dict(requests[n], timeLimit=max(int((deadline - time.time()) * 1000 / rounds), 1))
+
+    latest = {}  # last roster of every component
+
+    def rosterFound(n, value):
+        latest[n] = value
+        if onRoster is not None and len(latest) == len(requests):
+            merged = _mergeComponents(data, components, demand, latest)
+            merged["Solution"] = sum([r.get("Solution", 0) for r in latest.values()])
+            onRoster(merged)
+
+    results = {}
+    failed = None
+    if len(requests) > 1 and not multiprocessing.current_process().daemon:
+        queue = multiprocessing.Queue()
+        pending = sorted(requests)
+        running = {}
+        try:
+            # a component without solution stops the other ones
+            while (pending or running) and failed is None and all(r.get("Error") == 0 for r in results.values()):
+                while pending and len(running) < size:
+                    n = pending.pop(0)
+                    running[n] = multiprocessing.Process(target=_runComponent,
+                                                         args=(n, limited(n, len(pending) + 1, size), choose_type,
+                                                               queue, onRoster is not None,
+                                                               max(size // min(size, len(requests)), 1)))
+                    running[n].start()
+                try:
+                    msg, (n, value) = queue.get(timeout=1)
+                except Queue.Empty:
+                    dead = [n for n, process in running.items() if not process.is_alive()]
+                    if not dead:
+                        continue
+                    try:
+                        # a process may put its result right before exiting
+                        msg, (n, value) = queue.get_nowait()
+                    except Queue.Empty:
+                        n = dead[0]
+                        msg, value = 'failed', {"Error": 1, "Message": "Solver process exited with code %s" %
+                                                                      running[n].exitcode}
+                if msg == 'roster':
+                    rosterFound(n, value)
+                    continue
+                running.pop(n).join()
+                if msg == 'failed':
+                    failed = value
+                else:
+                    results[n] = value
+                    if onSolution is not None:
+                        onSolution(sum([r.get("Cost", 0) for r in results.values()]), len(results))
+        finally:
+            for process in running.values():
+                process.terminate()
+                process.join()
+    else:
+        order = sorted(requests)
+        for i, n in enumerate(order):
+            results[n] = solveSchedule(limited(n, len(order) - i, 1), choose_type,
+                                       onRoster=(lambda roster, n=n: rosterFound(n, roster)) if onRoster else None,
+                                       processes=size)
+            if results[n].get("Error") != 0:
+                break
+            if onSolution is not None:
+                onSolution(sum([r.get("Cost", 0) for r in results.values()]), len(results))
+
+    metrics = {"Mode": "components", "WallTime": int((time.time() - start) * 1000),
+               "Components": [{"Tasks": [data['nameTasks'][t] for t in components[n][0]],
+                               "Workers": len(components[n][1]), "Cost": results[n].get("Cost"),
+                               "Metrics": results[n].get("Metrics")} for n in sorted(results)]}
+    if failed is not None:
+        raise InfeasibleError("allRequirements", failed.get("Message", "A component has no solution"),
+                              failed.get("Details"))
+    if any(r.get("Error") != 0 for r in results.values()):
+        log.warning("No solution for a component of the roster")
+        return {"Error": 1, "Metrics": metrics}
+
+    for k in ("Branches", "Failures", "Solutions"):
+        metrics[k] = sum([(r.get("Metrics") or {}).get(k) or 0 for r in results.values()])
+    jsonResult = _mergeComponents(data, components, demand, results)
+    jsonResult["LowerBound"] = sum([r.get("LowerBound", 0) for r in results.values()])
+    jsonResult["Metrics"] = metrics
+    return jsonResult
+
+
+def requestKey(data):
+    """
+    Content-address of a scheduling request, the same request solved by the same solver
+    version and search limits gets the same key
+
+    :param data: dict with the JSON request
+    :return: string with the hash of the normalized request
+    """
+    workers = [dict(w, ATasks=sorted(w['ATasks']), AShifts=sorted(w['AShifts'])) for w in data['allWorkers']]
+    request = {
+        "nameShifts": data['nameShifts'],
+        "nameTasks": data['nameTasks'],
+        "allWorkers": workers,
+        "allRequirements": data['allRequirements'],
+        "leaveRequests": sorted(list(r) for r in data['leaveRequests']),
+        "maxConsecutiveWorkingDays": data['maxConsecutiveWorkingDays'],
+        "avoidOvertime": data['avoidOvertime'],
+        "model": data.get('model', 'full'),
+        "engine": data.get('engine', 'cp'),
+        "searchMode": data.get('searchMode', 'tree'),
+        "portfolioResult": data.get('portfolioResult'),
+        "previousSolution": data.get('previousSolution'),
+        "previousAssigned": sorted(list(c) for c in data.get('previousAssigned') or []),
+        "windowDays": data.get('windowDays'),
+        "windowTimeLimit": data.get('windowTimeLimit'),
+        "frozenDays": data.get('frozenDays', 0),
+        "initialWorkingDays": data.get('initialWorkingDays'),
+        "fairnessMean": data.get('fairnessMean'),
+        "initialDays": data.get('initialDays'),
+        "decompose": data.get('decompose', True),
+        "symmetryBreaking": data.get('symmetryBreaking', True),
+        "shiftHours": data.get('shiftHours'),
+        "periodDays": data.get('periodDays'),
+        "periodStart": data.get('periodStart', 0),
+        "workloadPenalty": data.get('workloadPenalty', SchedulingSolver.C_WORKLOADPENALTY),
+        "shiftsPenalty": data.get('shiftsPenalty', SchedulingSolver.C_SHIFTSLIMITPENALTY),
+        "fairnessPenalty": data.get('fairnessPenalty', 0),
+        "shiftRules": data.get('shiftRules') or []
+    }
+    return ResultCache.key(request, SchedulingSolver.C_VERSION, SchedulingSolver.searchLimits(data))
+
+
+def cacheKey(data):
+    """
+    Key of a request on the result cache (see requestKey), the results of the portfolio (the processes
+    race for the best cost) and of the LNS (random fragments, restarts on time) are not cached, the
+    same request may get a different roster
+
+    :param data: dict with the JSON request, not validated yet
+    :return: string with the key, None if the result of the request is not cached
+    """
+    if not isinstance(data, dict) or data.get('searchMode') in SchedulingSolver.C_RANDOMMODES:
+        return None
+    try:
+        return requestKey(data)
+    except (KeyError, TypeError, AttributeError, ValueError):
+        return None  # malformed, checkRequest tells why
+
+
+def _runJob(data, queue, rosters=False):
+    """
+    Solve an async job on a solver process, the progress and the result are sent through the queue
+
+    :param data: dict with the JSON request, already validated (see checkRequest)
+    :param queue: multiprocessing.Queue to put the ('progress'|'roster'|'done'|'failed', value) messages
+    :param rosters: send also the JSON result of every improving solution
+    :return: void
+    """
+    def onSolution(cost, nsolution):
+        queue.put(('progress', (cost, nsolution)))
+
+    def onRoster(roster):
+        queue.put(('roster', roster))
+
+    signal.signal(signal.SIGTERM, _stopJob)
+    try:
+        queue.put(('done', solveSchedule(data, onSolution=onSolution, onRoster=onRoster if rosters else None,
+                                         check=False)))
+    except GenericError as e:
+        queue.put(('failed', e.toJSON()))
+    except Exception as e:
+        queue.put(('failed', str(e)))
+
+
+def _stopJob(signum, frame):
+    """
+    SIGTERM of a job process (see JobManager.cancel), its own solver processes (portfolio, components) are
+    stopped too instead of searching until their time limit
+    """
+    for process in multiprocessing.active_children():
+        process.terminate()
+    os._exit(1)
+
+
+class JobManager:
+    """
+    Async scheduling jobs, every job is solved on its own process while the server keeps
+    the status, the best cost found so far and the result
+    """
+
+    C_JOBTTL = 3600  # seconds a finished job is kept
+    C_MAXWAIT = 30  # max seconds of a long-poll, see status and rosters
+
+    def __init__(self, max_running=multiprocessing.cpu_count(), queue_depth=8, metrics=None):
+        self.max_running = max_running
+        self.queue_depth = queue_depth
+        self.metrics = metrics  # MetricsRegistry to add the results of the finished jobs
+        self.jobs = {}
+        self.pending = []
+        self.running = 0
+        self.processes = {}
+        self.cancelled = set()  # ids of the running jobs stopped by cancel
+        self.changed = threading.Condition()
+
+
+    def close(self):
+        """
+        Stop the running jobs
+
+        :return: void
+        """
+        with self.changed:
+            self.pending = []
+            processes = list(self.processes.values())
+        for process in processes:
+            process.terminate()
+
+
+    def cancel(self, jobid):
+        """
+        Stop a queued or running job (e.g. its streaming client is gone), it ends as failed
+
+        :param jobid: the job id
+        :return: void
+        """
+        with self.changed:
+            for item in self.pending:
+                if item[0] == jobid:
+                    self.pending.remove(item)
+                    self._update(jobid, Status="failed", Result={"Error": 1, "Message": "Cancelled"})
+                    return
+            process = self.processes.get(jobid)
+            if process is None:
+                return
+            self.cancelled.add(jobid)
+        process.terminate()
+
+
+    def submit(self, data, rosters=False):
+        """
+        Add a new job
+
+        :param data: dict with the JSON request, already validated (see checkRequest)
+        :param rosters: keep the JSON result of every improving solution (see rosters)
+        :return: the job id, None if the queue is full
+        """
+        with self.changed:
+            self._purge()
+            if self.running >= self.max_running and len(self.pending) >= self.queue_depth:
+                return None
+            jobid = uuid.uuid4().hex
+            self.jobs[jobid] = {"JobId": jobid, "Status": "queued", "Cost": -1, "Solutions": 0,
+                                "Version": 0, "Result": None, "Rosters": [], "Updated": time.time()}
+            self.pending.append((jobid, data, rosters))
+            self._startPending()
+        return jobid
+
+
+    def status(self, jobid, wait=0, version=None):
+        """
+        Status of a job, waits for a change when wait > 0 (long-poll)
+
+        :param jobid: the job id
+        :param wait: max seconds to wait for the job to change from version, up to C_MAXWAIT
+        :param version: last version known by the client, by default the current one
+        :return: dict with the job status (without the result), None if the job doesn't exist
+        """
+        deadline = time.time() + min(wait, self.C_MAXWAIT)
+        with self.changed:
+            job = self.jobs.get(jobid)
+            if job is None:
+                return None
+            if version is None:
+                version = job["Version"]
+            while job["Version"] == version and job["Status"] not in ("done", "failed"):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+            return dict((k, v) for k, v in job.items() if k not in ("Result", "Rosters"))
+
+
+    def rosters(self, jobid, start, wait):
+        """
+        JSON results of the improving solutions of a job submitted with rosters, waits for new ones
+
+        :param jobid: the job id
+        :param start: number of rosters already read by the client
+        :param wait: max seconds to wait for a new roster or the end of the job, up to C_MAXWAIT
+        :return: (list of the new rosters, job dict), None if the job doesn't exist
+        """
+        deadline = time.time() + min(wait, self.C_MAXWAIT)
+        with self.changed:
+            job = self.jobs.get(jobid)
+            if job is None:
+                return None
+            while len(job["Rosters"]) <= start and job["Status"] not in ("done", "failed"):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+            return job["Rosters"][start:], dict(job)
+
+
+    def result(self, jobid):
+        """
+        :param jobid: the job id
+        :return: the job dict with the final JSON result on "Result", None if the job doesn't exist
+        """
+        with self.changed:
+            job = self.jobs.get(jobid)
+            return None if job is None else dict(job)
+
+
+    def _startPending(self):
+        while self.pending and self.running < self.max_running:
+            jobid, data, rosters = self.pending.pop(0)
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_runJob, args=(data, queue, rosters))
+            # not a daemon, a job may start its own solver processes (portfolio), see close
+            process.start()
+            self.processes[jobid] = process
+            self.running += 1
+            self._update(jobid, Status="running")
+            reader = threading.Thread(target=self._readJob, args=(jobid, process, queue))
+            reader.daemon = True
+            reader.start()
+
+
+    def _readJob(self, jobid, process, queue):
+        status = "failed"
+        while True:
+            try:
+                msg, value = queue.get(timeout=1)
+            except Queue.Empty:
+                if process.is_alive():
+                    continue
+                try:
+                    # the process may put its last messages right before exiting
+                    msg, value = queue.get_nowait()
+                except Queue.Empty:
+                    value = "Cancelled" if jobid in self.cancelled else \
+                            "Solver process exited with code %s" % process.exitcode
+                    break
+            if msg == 'progress':
+                with self.changed:
+                    self._update(jobid, Cost=value[0], Solutions=value[1])
+            elif msg == 'roster':
+                with self.changed:
+                    self.jobs[jobid]["Rosters"].append(value)
+                    self._update(jobid)
+            else:
+                status = msg
+                break
+        process.join()
+        with self.changed:
+            self.processes.pop(jobid, None)
+            self.cancelled.discard(jobid)
+            if status == "done":
+                self._update(jobid, Status=status, Result=value)
+                if self.metrics is not None:
+                    self.metrics.record(value)
+            else:
+                self._update(jobid, Status=status,
+                             Result=value if isinstance(value, dict) else {"Error": 1, "Message": value})
+            self.running -= 1
+            self._startPending()
+
+
+    def _update(self, jobid, **values):
+        job = self.jobs[jobid]
+        job.update(values)
+        job["Version"] += 1
+        job["Updated"] = time.time()
+        self.changed.notify_all()
+
+
+    def _purge(self):
+        expired = time.time() - self.C_JOBTTL
+        for jobid in [j for j, job in self.jobs.items()
+                      if job["Status"] in ("done", "failed") and job["Updated"] < expired]:
+            del self.jobs[jobid]
+
+
+def main():
+
+    cost =0
+
+    #TODO: Falta procedimiento de Carga de empleados y planificaciones externas
+
+    mysched = SchedulingSolver()
+    choose_types = ChooseTypeDb
+    data = {
+        "nameShifts" : ["MAN", "TAR", "NOC"],
+        "nameTasks": ['Operario','Supervisor', 'Revisor'],
+        "allWorkers": [{'ID':'001','Name': '---', 'ATasks': [0, 1, 2], 'AShifts': [0, 1, 2]},
+                            {'ID':'002','Name': 'Op1', 'ATasks': [0], 'AShifts': [0, 1]},
+                            {'ID':'003','Name': 'Op2', 'ATasks': [0], 'AShifts': [0, 1]},
+                            {'ID':'004','Name': 'Op3', 'ATasks': [0], 'AShifts': [0, 1, 2]},
+                            {'ID':'005','Name': 'Op4', 'ATasks': [0, 2], 'AShifts': [0, 1, 2]},
+                            {'ID':'006','Name': 'Op5', 'ATasks': [0], 'AShifts': [0, 1]},
+                            {'ID':'007','Name': 'Re1', 'ATasks': [0, 2], 'AShifts': [0, 2]},
+                            {'ID':'008','Name': 'Su1', 'ATasks': [1], 'AShifts': [0, 1, 2]},
+                            {'ID':'009','Name': 'Su2', 'ATasks': [1], 'AShifts': [0, 1, 2]},
+                            {'ID':'010','Name': 'Su3', 'ATasks': [1, 2], 'AShifts': [0, 2]}],
+        "allRequirements": [([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                                    ([1, 1, 0], [1, 1, 0], [0, 0, 0]),
+                                    ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                                    ([2, 1, 0], [1, 1, 0], [0, 0, 1]),
+                                    ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                                    ([3, 1, 1], [1, 1, 0], [0, 0, 1]),
+                                    ([2, 1, 1], [1, 1, 0], [0, 1, 1])]
+    }
+    mysched.loadJSONData(data)
+    mysched.definedModel()
+    mysched.hardConstraints()
+    mysched.softConstraints()
+    mysched.createDecisionBuilderPhase(choose_types.CHOOSE_MIN_SIZE_LOWEST_MIN.value)
+    cost=mysched.searchSolutionsCollector(0)
+
+    exit(0)
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    HTTP server that handles every request on its own thread, so the long-polls and the streams of the
+    async jobs don't block the other clients, and solves the requests one by one on the server process
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler)
+        self.solving = threading.Lock()
+
+
+    def solve(self, data):
+        """
+        Solve the request on the server process, after the ones already being solved
+
+        :param data: dict with the JSON request, already validated (see checkRequest)
+        :return: dict with the JSON result
+        """
+        with self.solving:
+            return solveSchedule(data, check=False)
+
+
+class SchedulingServer(ThreadingServer):
+    """
+    HTTP server that handles every request on its own thread and solves it on a bounded
+    pool of solver processes
+    """
+
+    C_POOLWORKERS = multiprocessing.cpu_count()  # default number of solver processes
+    C_POOLQUEUE = 8  # default max number of requests waiting for a free solver process
+    C_PORTFOLIOS = 1  # max portfolio requests solved at the same time, each one with as many processes as the pool
+    C_POOLGRACE = 30  # seconds over the time limit of a request to wait for its solver process (model build)
+
+    def __init__(self, server_address, handler, workers=C_POOLWORKERS, queue_depth=C_POOLQUEUE):
+        ThreadingServer.__init__(self, server_address, handler)
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.pool = multiprocessing.Pool(workers)
+        # one slot for every running request plus the queued ones
+        self.slots = threading.BoundedSemaphore(workers + queue_depth)
+        # the requests on the pool, at most one per solver process so a request starts as soon as it is sent
+        self.running = threading.BoundedSemaphore(workers)
+        self.portfolios = threading.BoundedSemaphore(self.C_PORTFOLIOS)
+
+
+    def solve(self, data):
+        """
+        Solve the request on the process pool
+
+        :param data: dict with the JSON request, already validated (see checkRequest)
+        :return: dict with the JSON result, None if the pool is saturated
+        :raise SolverError: the solver process doesn't answer on the time limit of the request (e.g. it died)
+        """
+        if not self.slots.acquire(False):
+            return None
+        try:
+            if data.get('searchMode') == 'portfolio':
+                # the portfolio starts its own solver processes, the pool ones can't have children, at most
+                # C_PORTFOLIOS portfolios of the size of the pool run besides it, the next ones wait on the queue
+                with self.portfolios:
+                    return solveSchedule(data, check=False, processes=self.workers)
+            with self.running:
+                result = self.pool.apply_async(solveSchedule, (data,), {'check': False})
+                try:
+                    return result.get(SchedulingSolver.searchLimits(data)[0] / 1000.0 + self.C_POOLGRACE)
+                except multiprocessing.TimeoutError:
+                    # a dead solver process never answers, the pool replaces it but its request is lost
+                    raise SolverError("pool", "The solver process didn't answer on the time limit of the request")
+        finally:
+            self.slots.release()
+
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+
+
+class MyServer(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    C_STREAMWAIT = 1  # max seconds between checks of a streamed request
+
+    def do_POST(self):
+
+        # print("\n----- Request Start ----->\n")
+        # request_path = s.path
+
+        # print(request_path)
+        
+        # request_headers = s.headers
+        # content_length = request_headers.getheaders('content-length')
+        # length = int(content_length[0]) if content_length else 0
+        
+        # print(request_headers)
+        # print(s.rfile.read(length))
+        # print("<----- Request End -----\n")
+
+
+        """Respond to a POST request."""
+
+        # Extract and print the contents of the POST
+        # length = int(s.headers['Content-Length'])
+        # post_data = urlparse.parse_qs(s.rfile.read(length).decode('utf-8'))
+        # data = json.loads(post_data['json'][0])
+        # data = json.loads(request.body)
+
+        # correlation id of the request, logged by the solver and sent back on X-Request-Id
+        self.requestid = self.headers.get('X-Request-Id') or uuid.uuid4().hex[:8]
+        try:
+            data_string = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                data = json.loads(data_string)
+            except ValueError:
+                raise RequestError("request", "The request is not valid JSON")
+            if isinstance(data, dict):
+                data['requestId'] = self.requestid
+
+            #TODO: Falta procedimiento de Carga de empleados y planificaciones externas
+
+            self.solveRequest(data)
+        except GenericError as e:
+            # a bad request only costs its own response
+            requestLogger('solver_v3', self.requestid).warning("Request error %i: %s (%s)", e.number, e.mensaje,
+                                                               e.expresion)
+            self.countRequest(type(e).__name__)
+            self.sendJSON(e.status, e.toJSON())
+        except Exception as e:
+            # a bug or a request that the checks let through, the server goes on
+            requestLogger('solver_v3', self.requestid).exception("Internal error solving the request")
+            self.countRequest("InternalError")
+            self.sendJSON(500, {"Error": 500, "Message": "Internal error: %s" % e})
+
+
+    def solveRequest(self, data):
+        """
+        Route a POST request: async job, streamed solutions or solved (or cached) JSON result. The request is
+        validated once (see checkRequest), after the cache lookup so a cached result is sent right away
+
+        :param data: dict with the JSON request
+        :return: void
+        :raise GenericError: the request can't be solved, see checkRequest
+        """
+        if urlparse.urlparse(self.path).path.rstrip('/') == '/jobs':
+            checkRequest(data)
+            self.submitJob(data)
+            return
+
+        accept = self.headers.get('Accept', '')
+        if 'text/event-stream' in accept or 'application/x-ndjson' in accept:
+            checkRequest(data)
+            self.streamSolutions(data, 'text/event-stream' in accept)
+            return
+
+        cache = getattr(self.server, 'cache', None)
+        key = cacheKey(data) if cache is not None else None
+        if key is not None:
+            cost = cache.get(key)
+            if cost is not None:
+                self.countRequest("CacheHit")
+                self.sendJSON(200, cost, {'X-Cache': 'HIT'})
+                return
+
+        checkRequest(data)
+        solve = getattr(self.server, 'solve', None)
+        cost = solve(data) if solve is not None else solveSchedule(data, check=False)
+
+        if cost is None:
+            # backpressure, all the solver processes are busy and the queue is full
+            self.countRequest("Busy")
+            self.sendJSON(503, {"Error": 503}, {'Retry-After': '1'})
+            return
+
+        if key is not None and cost.get("Error") == 0:
+            # a request without solution on the time limit may be solved on a retry
+            cache.put(key, cost)
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None:
+            metrics.record(cost)
+
+        # print(cost)
+        self.sendJSON(200, cost, {'X-Cache': 'MISS'} if cache is not None else None)
+
+
+    def do_GET(self):
+        """Respond to a GET request, /jobs/<id> for the status of an async job (?wait=<sec>&version=<n>
+        to long-poll for a change), /jobs/<id>/result for its final JSON result and /metrics for the
+        aggregated search metrics of the solved requests."""
+
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        parts = [p for p in url.path.split('/') if p]
+        jobs = getattr(self.server, 'jobs', None)
+
+        if parts == ['metrics']:
+            self.sendMetrics()
+            return
+
+        if jobs is None or parts[:1] != ['jobs'] or len(parts) not in (2, 3) or parts[2:] not in ([], ['result']):
+            self.sendJSON(404, {"Error": 404})
+            return
+
+        if len(parts) == 2:
+            try:
+                wait = float(query.get('wait', [0])[0])
+                version = int(query['version'][0]) if query.get('version') else None
+            except ValueError:
+                wait = -1
+            if not wait >= 0:  # also NaN
+                error = RequestError("wait", "wait must be a non negative number of seconds and version an int")
+                self.sendJSON(error.status, error.toJSON())
+                return
+            status = jobs.status(parts[1], wait, version)
+            if status is None:
+                self.sendJSON(404, {"Error": 404})
+            else:
+                self.sendJSON(200, status)
+            return
+
+        job = jobs.result(parts[1])
+        if job is None:
+            self.sendJSON(404, {"Error": 404})
+        elif job["Status"] in ("done", "failed"):
+            self.sendJSON(200, job["Result"])
+        else:
+            # not finished yet
+            del job["Result"]
+            self.sendJSON(202, job)
+
+
+    def sendMetrics(self):
+        """
+        Send the aggregated metrics of the server (see MetricsRegistry) with the result cache and
+        the async jobs counters
+
+        :return: void
+        """
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is None:
+            self.sendJSON(404, {"Error": 404})
+            return
+
+        data = metrics.toJSON()
+        data["TimeLimit"] = SchedulingSolver.C_TIMELIMIT
+        cache = getattr(self.server, 'cache', None)
+        if cache is not None:
+            data["Cache"] = {"Hits": cache.hits, "Misses": cache.misses}
+        jobs = getattr(self.server, 'jobs', None)
+        if jobs is not None:
+            data["Jobs"] = {"Running": jobs.running, "Pending": len(jobs.pending)}
+        self.sendJSON(200, data)
+
+
+    def countRequest(self, outcome):
+        """
+        Count a request without a solved result on the metrics of the server
+
+        :param outcome: CacheHit, Busy, InternalError or the name of the GenericError
+        :return: void
+        """
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None:
+            metrics.count(outcome)
+
+
+    def submitJob(self, data):
+        """
+        Add an async job and answer with its id
+
+        :param data: dict with the JSON request
+        :return: void
+        """
+        jobs = getattr(self.server, 'jobs', None)
+        if jobs is None:
+            self.sendJSON(404, {"Error": 404})
+            return
+
+        jobid = jobs.submit(data)
+        if jobid is None:
+            self.countRequest("Busy")
+            self.sendJSON(503, {"Error": 503}, {'Retry-After': '1'})
+        else:
+            self.sendJSON(202, jobs.status(jobid), {'Location': '/jobs/%s' % jobid})
+
+
+    def streamSolutions(self, data, sse=False):
+        """
+        Solve the request and stream the JSON result of every improving solution as soon as it is
+        found, one JSON per line (NDJSON) or as server-sent events, the last one is the final
+        result with "Final": true
+
+        :param data: dict with the JSON request
+        :param sse: True for server-sent events, False for NDJSON
+        :return: void
+        """
+        jobs = getattr(self.server, 'jobs', None)
+        if jobs is None:
+            self.sendJSON(404, {"Error": 404})
+            return
+        if not isinstance(self.server, SocketServer.ThreadingMixIn):
+            # a stream holds its handler thread for the whole search
+            self.sendJSON(501, {"Error": 501, "Message": "Streaming needs a threaded server"})
+            return
+
+        jobid = jobs.submit(data, rosters=True)
+        if jobid is None:
+            self.countRequest("Busy")
+            self.sendJSON(503, {"Error": 503}, {'Retry-After': '1'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Request-Id', self.requestid)
+        self.end_headers()
+
+        sent = 0
+        try:
+            while True:
+                rosters, job = jobs.rosters(jobid, sent, self.C_STREAMWAIT)
+                for roster in rosters:
+                    self.writeEvent('solution', roster, sse)
+                sent += len(rosters)
+                if job["Status"] in ("done", "failed"):
+                    result = dict(job["Result"])
+                    result["Final"] = True
+                    self.writeEvent('result', result, sse)
+                    break
+                if self.clientClosed():
+                    jobs.cancel(jobid)
+                    break
+        except socket.error:
+            # the client has closed the connection, nobody waits for the job
+            jobs.cancel(jobid)
+
+
+    def clientClosed(self):
+        """
+        :return: True if the client has closed the connection, its socket is readable without data
+        """
+        try:
+            if not select.select([self.connection], [], [], 0)[0]:
+                return False
+            return not self.connection.recv(1, socket.MSG_PEEK)
+        except socket.error:
+            return True
+
+
+    def log_message(self, format, *args):
+        """Log the requests (access log) on the solver_v3 logger instead of stderr"""
+        requestLogger('solver_v3', getattr(self, 'requestid', '-')).info("%s - %s", self.address_string(),
+                                                                           format % args)
+
+
+    def writeEvent(self, event, data, sse):
+        """
+        Write and flush a streamed JSON
+
+        :param event: SSE event name
+        :param data: dict to send as JSON
+        :param sse: True for server-sent events, False for NDJSON
+        :return: void
+        """
+        if sse:
+            self.wfile.write("event: %s\ndata: %s\n\n" % (event, json.dumps(data)))
+        else:
+            self.wfile.write(json.dumps(data) + "\n")
+        self.wfile.flush()
+
+
+    def sendJSON(self, code, data, headers=None):
+        """
+        Send a JSON response
+
+        :param code: HTTP status code
+        :param data: dict to send as JSON
+        :param headers: dict with extra headers
+        :return: void
+        """
+        dump = json.dumps(data)
+        self.send_response(code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dump)))
+        if getattr(self, 'requestid', None):
+            self.send_header('X-Request-Id', self.requestid)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
         self.end_headers()
         self.wfile.write(dump)
 
 
 if __name__ == "__main__":
     #main()
-    BaseHTTPServer.HTTPServer(('localhost', 8000), MyServer).serve_forever()
\ No newline at end of file
+    args = parser.parse_args()
+    setupLogging(logging.WARNING if args.quiet else getattr(logging, args.log_level))
+    if args.workers > 0:
+        httpd = SchedulingServer((args.host, args.port), MyServer, args.workers, args.queue)
+    else:
+        # threaded anyway, the async jobs are long-polled and streamed while other requests come in
+        httpd = ThreadingServer((args.host, args.port), MyServer)
+    httpd.metrics = MetricsRegistry()
+    httpd.jobs = JobManager(args.jobs, args.queue, httpd.metrics)
+    if args.cache_size > 0:
+        httpd.cache = ResultCache(args.cache_size, args.cache_ttl, args.cache_dir)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.jobs.close()
+        httpd.server_close()
\ No newline at end of file
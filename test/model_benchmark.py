@@ -0,0 +1,228 @@
+"""
+Benchmark of the model build and the search of the solver versions on synthetic instances of growing size.
+Every phase (definedModel, hardConstraints, softConstraints and the search) is timed separately and every
+run is done on its own process to measure its memory, the results can be written to a JSON file to compare
+them between versions and commits:
+
+    python test/model_benchmark.py --versions v3,v3-compact,v3-mip,v2b --output bench.json
+
+The relCandidate versions have no loadJSONData, they are run once with the data of their loadData
+"""
+from __future__ import print_function
+import argparse
+import imp
+import json
+import multiprocessing
+import os
+import platform
+import Queue
+import random
+import resource
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument('--sizes', default = '10x7,50x14,100x28,200x28',
+                    help = 'comma separated list of <workers>x<days> instances')
+parser.add_argument('--tasks', default = 10, type = int,
+                    help = 'number of tasks of the instances')
+parser.add_argument('--seed', default = 0, type = int,
+                    help = 'seed for the instance generator')
+parser.add_argument('--versions', default = 'v3,v3-compact,v3-mip',
+                    help = 'comma separated list of solver versions: %s' % ', '.join(
+                        ['v3', 'v3-compact', 'v3-mip', 'v2b', 'v2a', 'v1d', 'v1c', 'v1b', 'v1a']))
+parser.add_argument('--search', default = 1000, type = int,
+                    help = 'time limit of the search in ms, 0 to benchmark only the model build')
+parser.add_argument('--output', default = None,
+                    help = 'JSON file to write the results')
+
+# version -> (module file, class name)
+VERSIONS = {
+    'v3': ('solver_v3.py', 'SchedulingSolver'),
+    'v3-compact': ('solver_v3.py', 'CompactSchedulingSolver'),
+    'v3-mip': ('solver_v3.py', 'MipSchedulingSolver'),
+    'v2b': ('solver_v2b.py', 'SchedulingSolver'),
+    'v2a': ('relCandidate/solver_v2a.py', 'SchedulingSolver'),
+    'v1d': ('relCandidate/solver_v1d.py', 'SchedulingSolver'),
+    'v1c': ('relCandidate/solver_v1c.py', 'SchedulingSolver'),
+    'v1b': ('relCandidate/solver_v1b.py', 'SchedulingSolver'),
+    'v1a': ('relCandidate/solver_v1a.py', 'SchedulingSolver'),
+}
+
+PHASES = ['definedModel', 'hardConstraints', 'softConstraints']
+
+
+def instance(nworkers, ndays, ntasks=3, nshifts=3, seed=0, occupancy=0.5, leaves=0.05):
+    """
+    Synthetic request like the main() data, worker 0 is the "---" worker
+
+    :param occupancy: rate of the workers required every day
+    :param leaves: rate of the (worker, day, shift) with a leave request
+    :return: dict with the JSON request
+    """
+    rand = random.Random(seed)
+    workers = [{'ID': '000', 'Name': '---', 'ATasks': list(range(ntasks)), 'AShifts': list(range(nshifts))}]
+    for w in range(1, nworkers):
+        workers.append({'ID': '%03i' % w, 'Name': 'W%i' % w,
+                        'ATasks': sorted(rand.sample(range(ntasks), rand.randint(1, min(3, ntasks)))),
+                        'AShifts': sorted(rand.sample(range(nshifts), rand.randint(1, nshifts)))})
+
+    requirements = []
+    for d in range(ndays):
+        day = [[0] * nshifts for t in range(ntasks)]
+        for n in range(int((nworkers - 1) * occupancy)):
+            day[rand.randrange(ntasks)][rand.randrange(nshifts)] += 1
+        requirements.append(day)
+
+    leave_requests = []
+    for w in range(1, nworkers):
+        for d in range(ndays):
+            if rand.random() < leaves:
+                leave_requests.append([w, d, rand.randrange(nshifts)])
+
+    return {
+        "nameShifts": ['S%i' % s for s in range(nshifts)],
+        "nameTasks": ['T%i' % t for t in range(ntasks)],
+        "allWorkers": workers,
+        "allRequirements": requirements,
+        "avoidOvertime": True,
+        "maxConsecutiveWorkingDays": 5,
+        "leaveRequests": leave_requests
+    }
+
+
+def loadVersion(version):
+    """
+    Import the class of a solver version from its file
+    """
+    path, classname = VERSIONS[version]
+    module = imp.load_source('bench_' + version.replace('-', '_'), os.path.join(ROOT, path))
+    return getattr(module, classname)
+
+
+def modelStats(mysched):
+    """
+    Model size of the versions without modelStats, counts the IntVar held by the solver instance
+    """
+    from ortools.constraint_solver import pywrapcp
+
+    nvars = 0
+    for value in vars(mysched).values():
+        if isinstance(value, dict):
+            value = list(value.values())
+        if isinstance(value, list):
+            nvars += len([v for v in value if isinstance(v, pywrapcp.IntVar)])
+    return {"Variables": nvars, "Constraints": mysched.solver.Constraints()}
+
+
+def maxRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def runVersion(version, data, search, queue):
+    """
+    Build the model (and search) on this process and put its stats on the queue
+    """
+    sys.stdout = open(os.devnull, 'w')
+    sys.stdin = open(os.devnull)
+    stats = {'Version': version}
+    try:
+        cls = loadVersion(version)
+        if data and hasattr(cls, 'C_MAXSOFTCONSTRAINTS'):
+            cls.C_MAXSOFTCONSTRAINTS = max(cls.C_MAXSOFTCONSTRAINTS,
+                                           len(data['allWorkers']) * len(data['allRequirements']))
+        if search:
+            cls.C_TIMELIMIT = cls._time_limit = search
+
+        start = time.time()
+        mysched = cls()
+        if data is None:
+            if hasattr(mysched, 'loadData'):  # v1a and v1b load their data on __init__
+                mysched.loadData()
+        else:
+            mysched.loadJSONData(data)
+        stats['Load'] = int((time.time() - start) * 1000)
+
+        for phase in PHASES:
+            start = time.time()
+            getattr(mysched, phase)()
+            stats[phase] = int((time.time() - start) * 1000)
+        stats['Build'] = stats['Load'] + sum([stats[phase] for phase in PHASES])
+        stats.update(mysched.modelStats() if hasattr(mysched, 'modelStats') else modelStats(mysched))
+        stats['BuildMaxRSS'] = maxRSS()
+
+        if search:
+            start = time.time()
+            mysched.createDecisionBuilderPhase()
+            cost = None
+            try:
+                cost = mysched.searchSolutionsCollector(0, toScreen=False)
+            except TypeError:
+                try:
+                    cost = mysched.searchSolutionsCollector(0)
+                except EOFError:
+                    pass  # v1d asks on stdin after showing the solution
+            stats['Search'] = int((time.time() - start) * 1000)
+            stats['Cost'] = cost if isinstance(cost, int) else None
+            stats['MaxRSS'] = maxRSS()
+    except Exception as e:
+        stats['Error'] = "%s: %s" % (type(e).__name__, e)
+    queue.put(stats)
+
+
+def benchmark(version, data, search):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=runVersion, args=(version, data, search, queue))
+    process.start()
+    # a failed check of or-tools aborts the process without putting its stats
+    while True:
+        try:
+            stats = queue.get(timeout=1)
+            break
+        except Queue.Empty:
+            if not process.is_alive():
+                stats = {'Version': version, 'Error': "process exit code %s" % process.exitcode}
+                break
+    process.join()
+    return stats
+
+
+def main(args):
+    instances = []
+    for size in args.sizes.split(','):
+        nworkers, ndays = [int(n) for n in size.split('x')]
+        instances.append((size, instance(nworkers, ndays, args.tasks, seed=args.seed)))
+
+    results = []
+    print("%-10s %-11s %10s %12s %8s %8s %8s %8s %8s %8s %12s" % (
+        "Instance", "Version", "Variables", "Constraints", "Model ms", "Hard ms", "Soft ms", "Build ms",
+        "Search ms", "Cost", "MaxRSS KB"))
+    for version in args.versions.split(','):
+        # the older versions only have the data of their loadData
+        builtin = not hasattr(loadVersion(version), 'loadJSONData')
+        for size, data in [('builtin', None)] if builtin else instances:
+            stats = benchmark(version, data, args.search)
+            stats['Instance'] = size
+            results.append(stats)
+            if 'Error' in stats:
+                print("%-10s %-11s %s" % (size, version, stats['Error']))
+                continue
+            print("%-10s %-11s %10i %12i %8i %8i %8i %8i %8s %8s %12i" % (
+                size, version, stats['Variables'], stats['Constraints'], stats['definedModel'],
+                stats['hardConstraints'], stats['softConstraints'], stats['Build'], stats.get('Search', '-'),
+                stats.get('Cost', '-'), stats.get('MaxRSS', stats['BuildMaxRSS'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"Date": time.strftime("%Y-%m-%d %H:%M:%S"), "Platform": platform.platform(),
+                       "Python": platform.python_version(), "Args": vars(args), "Results": results},
+                      f, indent=2, sort_keys=True)
+        print("Results written to", args.output)
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,64 @@
+"""
+Fairness test of the decomposed and rolling rosters, the workers of every component and window must be
+balanced around the mean shifts of the whole roster, so their cost is the one of a single model
+
+Run with: python -m unittest discover -s test -p "solver_v3_*.py"
+"""
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from solver_v3 import solveSchedule, taskComponents
+
+C_FAIRNESSPENALTY = 10
+
+# two components: the operators work every day (mean 4 shifts), the supervisors one day of four
+# (mean 0.5), the mean of the whole roster is 9 / 4 = 2.25 shifts
+data = {
+    "nameShifts": ["MAN"],
+    "nameTasks": ['Operario', 'Supervisor'],
+    "allWorkers": [{'ID': '001', 'Name': '---', 'ATasks': [0, 1], 'AShifts': [0]},
+                   {'ID': '002', 'Name': 'Op1', 'ATasks': [0], 'AShifts': [0]},
+                   {'ID': '003', 'Name': 'Op2', 'ATasks': [0], 'AShifts': [0]},
+                   {'ID': '004', 'Name': 'Su1', 'ATasks': [1], 'AShifts': [0]},
+                   {'ID': '005', 'Name': 'Su2', 'ATasks': [1], 'AShifts': [0]}],
+    "allRequirements": [([2], [1]),
+                        ([2], [0]),
+                        ([2], [0]),
+                        ([2], [0])],
+    "avoidOvertime": True,
+    "maxConsecutiveWorkingDays": None,
+    "leaveRequests": [],
+    "fairnessPenalty": C_FAIRNESSPENALTY,
+    "timeLimit": 5000
+}
+
+# operators 4 - 3 shifts over the mean each, supervisors 2 - 1 and 2 - 0 shifts under it
+C_COST = (1 + 1 + 1 + 2) * C_FAIRNESSPENALTY
+
+
+class FairnessMeanTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def testComponents(self):
+        self.assertEqual(len(taskComponents(data)), 2)
+        single = solveSchedule(dict(data, decompose=False))
+        components = solveSchedule(data)
+        self.assertEqual(single["Cost"], C_COST)
+        self.assertEqual(components["Cost"], C_COST)
+
+    def testWindows(self):
+        rolling = solveSchedule(dict(data, decompose=False, windowDays=2))
+        self.assertEqual(rolling["Cost"], C_COST)
+
+
+if __name__ == '__main__':
+    unittest.main()
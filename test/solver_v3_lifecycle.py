@@ -0,0 +1,84 @@
+"""
+Lifecycle test of the solver, every request must build its model on a fresh solver and
+release it with freeSolver, so the model size stays the same from one request to the next
+
+Run with: python -m unittest discover -s test -p "solver_v3_*.py"
+"""
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from solver_v3 import SchedulingSolver, ChooseTypeDb
+
+N_REQUESTS = 50
+
+data = {
+    "nameShifts": ["MAN", "TAR", "NOC"],
+    "nameTasks": ['Operario', 'Supervisor', 'Revisor'],
+    "allWorkers": [{'ID': '001', 'Name': '---', 'ATasks': [0, 1, 2], 'AShifts': [0, 1, 2]},
+                   {'ID': '002', 'Name': 'Op1', 'ATasks': [0], 'AShifts': [0, 1]},
+                   {'ID': '003', 'Name': 'Op2', 'ATasks': [0], 'AShifts': [0, 1]},
+                   {'ID': '004', 'Name': 'Op3', 'ATasks': [0], 'AShifts': [0, 1, 2]},
+                   {'ID': '005', 'Name': 'Op4', 'ATasks': [0, 2], 'AShifts': [0, 1, 2]},
+                   {'ID': '006', 'Name': 'Op5', 'ATasks': [0], 'AShifts': [0, 1]},
+                   {'ID': '007', 'Name': 'Re1', 'ATasks': [0, 2], 'AShifts': [0, 2]},
+                   {'ID': '008', 'Name': 'Su1', 'ATasks': [1], 'AShifts': [0, 1, 2]},
+                   {'ID': '009', 'Name': 'Su2', 'ATasks': [1], 'AShifts': [0, 1, 2]},
+                   {'ID': '010', 'Name': 'Su3', 'ATasks': [1, 2], 'AShifts': [0, 2]}],
+    "allRequirements": [([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                        ([1, 1, 0], [1, 1, 0], [0, 0, 0]),
+                        ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                        ([2, 1, 0], [1, 1, 0], [0, 0, 1]),
+                        ([2, 1, 0], [1, 1, 0], [0, 0, 0]),
+                        ([3, 1, 1], [1, 1, 0], [0, 0, 1]),
+                        ([2, 1, 1], [1, 1, 0], [0, 1, 1])],
+    "avoidOvertime": True,
+    "maxConsecutiveWorkingDays": 5,
+    "leaveRequests": [],
+    "timeLimit": 100
+}
+
+
+def solveOnce():
+    """
+    Run one request like solveSchedule does and return the model size
+    """
+    mysched = SchedulingSolver()
+    mysched.loadJSONData(data)
+    mysched.definedModel()
+    mysched.hardConstraints()
+    mysched.softConstraints()
+    mysched.createDecisionBuilderPhase(ChooseTypeDb.CHOOSE_MIN_SIZE_LOWEST_MIN.value)
+    mysched.searchSolutionsCollector(0, toScreen=False)
+    stats = mysched.modelStats()
+    mysched.freeSolver()
+    return mysched, stats
+
+
+class SolverLifecycleTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def testFreeSolver(self):
+        mysched, stats = solveOnce()
+        self.assertIsNone(mysched.solver)
+        self.assertIsNone(mysched.cost)
+        self.assertEqual(mysched.assignations, [])
+
+    def testModelSizeIsStable(self):
+        first = solveOnce()[1]
+        for i in range(1, N_REQUESTS):
+            stats = solveOnce()[1]
+            self.assertEqual((stats['Variables'], stats['Constraints']), (first['Variables'], first['Constraints']),
+                             "Model size grows on request %i" % i)
+
+
+if __name__ == '__main__':
+    unittest.main()